@@ -1,11 +1,14 @@
 import os
 import logging
-import time
 from datetime import datetime
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, session
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, session, current_app
 from werkzeug.utils import secure_filename
 from functools import wraps
-from models import db, AdminUser, APIToken, DataUpdateLog
+from models import db, AdminUser, APIToken, DataUpdateLog, RequestProfile
+from import_jobs import import_job_runner
+from import_profile import STAGE_LABELS as IMPORT_STAGE_LABELS
+from token_cache import token_cache
+from request_profiler import PROFILE_SAMPLE_RATE, PROFILE_KEEP_SLOWEST
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -98,6 +101,7 @@ def dashboard():
     # Get system statistics
     from rnc_service import rnc_service
     stats = rnc_service.get_database_stats()
+    cache_stats = rnc_service.result_cache.stats()
     
     # Get recent data updates
     recent_updates = DataUpdateLog.query.order_by(DataUpdateLog.created_at.desc()).limit(10).all()
@@ -109,6 +113,7 @@ def dashboard():
     return render_template('admin/dashboard.html', 
                          stats=stats, 
                          recent_updates=recent_updates,
+                         cache_stats=cache_stats,
                          active_tokens=active_tokens,
                          total_tokens=total_tokens)
 
@@ -135,41 +140,19 @@ def upload_data():
                 filepath = os.path.join('attached_assets', filename)
                 file.save(filepath)
                 
-                # Import data using existing importer
-                start_time = time.time()
+                # Import in the background so the worker keeps serving the API
+                remove_missing = request.form.get('remove_missing') == 'on'
+                job_id = import_job_runner.submit(
+                    current_app._get_current_object(),
+                    filename,
+                    filepath,
+                    admin_user=session.get('admin_username'),
+                    remove_missing=remove_missing
+                )
                 
-                # Log the import attempt
-                log_entry = DataUpdateLog()
-                log_entry.filename = filename
-                log_entry.admin_user = session.get('admin_username')
-                log_entry.status = 'processing'
-                db.session.add(log_entry)
-                db.session.commit()
-                
-                try:
-                    from data_importer import DataImporter
-                    importer = DataImporter()
-                    result = importer.import_from_file(filepath)
-                    import_duration = time.time() - start_time
-                    
-                    # Update log with results
-                    log_entry.records_imported = result.get('total_imported', 0)
-                    log_entry.records_updated = result.get('updated', 0)
-                    log_entry.records_new = result.get('new', 0)
-                    log_entry.import_duration = import_duration
-                    log_entry.status = 'success'
-                    db.session.commit()
-                    
-                    flash(f'Datos importados exitosamente: {result.get("total_imported", 0)} registros en {import_duration:.2f} segundos', 'success')
-                    logging.info(f'Data import successful by {session.get("admin_username")}: {result}')
-                    
-                except Exception as import_error:
-                    log_entry.status = 'error'
-                    log_entry.error_message = str(import_error)
-                    db.session.commit()
-                    
-                    flash(f'Error al importar datos: {str(import_error)}', 'error')
-                    logging.error(f'Data import failed: {import_error}')
+                flash(f'Archivo recibido. La importación #{job_id} se está procesando en segundo plano.', 'success')
+                logging.info(f'Data import job {job_id} started by {session.get("admin_username")}')
+                return redirect(url_for('admin.view_logs'))
                 
             except Exception as e:
                 flash(f'Error al procesar archivo: {str(e)}', 'error')
@@ -222,6 +205,7 @@ def toggle_token(token_id):
     token = APIToken.query.get_or_404(token_id)
     token.is_active = not token.is_active
     db.session.commit()
+    token_cache.invalidate(token.token)
     
     status = 'activado' if token.is_active else 'desactivado'
     flash(f'Token {status} exitosamente', 'success')
@@ -232,8 +216,10 @@ def toggle_token(token_id):
 def delete_token(token_id):
     """Delete API token"""
     token = APIToken.query.get_or_404(token_id)
+    token_value = token.token
     db.session.delete(token)
     db.session.commit()
+    token_cache.invalidate(token_value)
     
     flash('Token eliminado exitosamente', 'success')
     return redirect(url_for('admin.manage_tokens'))
@@ -246,7 +232,56 @@ def view_logs():
     logs = DataUpdateLog.query.order_by(DataUpdateLog.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
-    return render_template('admin/logs.html', logs=logs)
+    return render_template('admin/logs.html', logs=logs, stage_labels=IMPORT_STAGE_LABELS)
+
+@admin_bp.route('/import-jobs/<int:job_id>')
+@admin_required
+def import_job_status(job_id):
+    """Live progress of a background import job"""
+    log_entry = DataUpdateLog.query.get_or_404(job_id)
+    return jsonify(log_entry.to_job_dict())
+
+@admin_bp.route('/profiles')
+@admin_required
+def view_profiles():
+    """Browse saved request profiles, most recent or slowest first"""
+    page = request.args.get('page', 1, type=int)
+    view = 'slowest' if request.args.get('view') == 'slowest' else 'recent'
+    order = RequestProfile.duration_ms.desc() if view == 'slowest' else RequestProfile.created_at.desc()
+    profiles = RequestProfile.query.order_by(order).paginate(
+        page=page, per_page=25, error_out=False
+    )
+    return render_template('admin/profiles.html', profiles=profiles, view=view,
+                           sample_rate=PROFILE_SAMPLE_RATE, keep_slowest=PROFILE_KEEP_SLOWEST)
+
+@admin_bp.route('/profiles/<int:profile_id>')
+@admin_required
+def profile_detail(profile_id):
+    """cProfile output and SQL statements of one profiled request"""
+    profile = RequestProfile.query.get_or_404(profile_id)
+    return render_template('admin/profile_detail.html', profile=profile,
+                           statements=profile.get_sql_statements())
+
+@admin_bp.route('/profiles/<int:profile_id>/delete', methods=['POST'])
+@admin_required
+def delete_profile(profile_id):
+    """Delete one request profile"""
+    profile = RequestProfile.query.get_or_404(profile_id)
+    db.session.delete(profile)
+    db.session.commit()
+    
+    flash('Perfil eliminado exitosamente', 'success')
+    return redirect(url_for('admin.view_profiles'))
+
+@admin_bp.route('/profiles/clear', methods=['POST'])
+@admin_required
+def clear_profiles():
+    """Delete all request profiles"""
+    deleted = RequestProfile.query.delete()
+    db.session.commit()
+    
+    flash(f'{deleted} perfiles eliminados', 'success')
+    return redirect(url_for('admin.view_profiles'))
 
 @admin_bp.route('/manual-import', methods=['POST'])
 @admin_required
@@ -259,49 +294,19 @@ def manual_import():
             flash('Archivo DGII no encontrado', 'error')
             return redirect(url_for('admin.dashboard'))
         
-        # Log the import attempt
-        log_entry = DataUpdateLog()
-        log_entry.filename = "DGII_RNC_1753101730023.TXT"
-        log_entry.admin_user = session.get('admin_username')
-        log_entry.status = 'processing'
-        db.session.add(log_entry)
-        db.session.commit()
+        # Use update_existing=False for faster processing (skips existing records)
+        job_id = import_job_runner.submit(
+            current_app._get_current_object(),
+            "DGII_RNC_1753101730023.TXT",
+            file_path,
+            admin_user=session.get('admin_username'),
+            update_existing=False
+        )
         
-        start_time = time.time()
+        logging.info(f"🚀 Manual import job {job_id} initiated by {session.get('admin_username')}")
+        flash(f'Importación manual #{job_id} iniciada en segundo plano. Puede seguir su progreso en los logs.', 'success')
+        return redirect(url_for('admin.view_logs'))
         
-        # Enhanced logging for progress tracking
-        logging.info(f"🚀 Manual import initiated by {session.get('admin_username')}")
-        logging.info("📊 Import will show progress in application logs")
-        
-        try:
-            from data_importer import DataImporter
-            importer = DataImporter()
-            
-            # Use update_existing=False for faster processing (skips existing records)
-            result = importer.import_from_file(file_path, update_existing=False)
-            import_duration = time.time() - start_time
-            
-            # Update log with results
-            log_entry.records_imported = result.get('total_imported', 0)
-            log_entry.records_updated = result.get('updated', 0)
-            log_entry.records_new = result.get('new', 0)
-            log_entry.import_duration = import_duration
-            log_entry.status = 'success'
-            db.session.commit()
-            
-            flash(f'Importación manual completada exitosamente: {result.get("total_imported", 0)} registros importados, {result.get("new", 0)} nuevos en {import_duration:.1f} segundos', 'success')
-            logging.info(f'✅ Manual import completed by {session.get("admin_username")}: {result}')
-            
-        except Exception as import_error:
-            import_duration = time.time() - start_time
-            log_entry.status = 'error'
-            log_entry.error_message = str(import_error)
-            log_entry.import_duration = import_duration
-            db.session.commit()
-            
-            flash(f'Error en importación manual: {str(import_error)}', 'error')
-            logging.error(f'❌ Manual import failed after {import_duration:.1f}s: {import_error}')
-            
     except Exception as e:
         flash(f'Error al procesar importación manual: {str(e)}', 'error')
         logging.error(f'❌ Manual import processing error: {e}')
@@ -0,0 +1,268 @@
+import os
+import re
+import logging
+from typing import Dict, Optional, Tuple, Union
+from rnc_service import rnc_service
+from rate_limiter import create_rate_limiter
+from token_cache import token_cache, CachedToken
+from metrics import record_rejection
+
+# Framework-independent request handling shared by the Flask blueprint
+# (api_routes.py) and the asyncio server (async_server.py). Handlers return
+# (body, status) pairs; the body is a dict to be encoded as JSON, or bytes
+# that are already JSON.
+
+RATE_LIMIT_PER_MINUTE = 10  # Reduced for non-token requests
+
+# Seconds clients and proxies may reuse an RNC lookup before revalidating it
+LOOKUP_CACHE_MAX_AGE = int(os.environ.get('LOOKUP_CACHE_MAX_AGE', 300))
+
+# Fallback rate limiting for requests without tokens
+ip_rate_limiter = create_rate_limiter(RATE_LIMIT_PER_MINUTE, window=60)
+
+INTERNAL_ERROR = {"status": "error", "message": "Internal server error"}
+
+# Zero-I/O validation fields of an RNC lookup result (see RNCService.precheck)
+CHECK_FIELDS = ("format_valid", "checksum_valid")
+
+
+def check_fields(result: Dict) -> Dict:
+    """format_valid/checksum_valid of a lookup result, where present"""
+    return {field: result[field] for field in CHECK_FIELDS if field in result}
+
+
+def authorize_token(token_value: str, cost: int = 1) -> Tuple[Optional[CachedToken], Optional[Tuple[Dict, int]]]:
+    """Authenticate a token and reserve ``cost`` requests from its quota.
+
+    Returns (token, None) on success or (None, (error_body, status)) otherwise.
+    """
+    token = token_cache.get(token_value)
+
+    if not token:
+        return None, ({
+            "error": "Invalid token",
+            "message": "The provided API token is invalid or inactive"
+        }, 401)
+
+    if token.is_expired():
+        return None, ({
+            "error": "Token expired",
+            "message": "The provided API token has expired"
+        }, 401)
+
+    # Reserve the requests in memory; usage is written back in batches
+    if not token_cache.consume(token, cost):
+        record_rejection('token', token.name)
+        return None, ({
+            "error": "Rate limit exceeded",
+            "message": f"Token rate limit exceeded. Maximum {token.requests_per_hour} requests per hour allowed"
+        }, 429)
+
+    token_cache.maybe_flush()
+    return token, None
+
+
+def authorize_request(client_ip: str, token_value: Optional[str], method: str, path: str) -> Optional[Tuple[Dict, int]]:
+    """Apply token or IP rate limiting to an API request; returns an error (body, status) or None"""
+    if token_value:
+        # Token-based rate limiting
+        token, error = authorize_token(token_value)
+        if error:
+            return error
+        logging.info(f"API Request from {client_ip} with token {token.name}: {method} {path}")
+        return None
+
+    # IP-based rate limiting for requests without tokens
+    if not ip_rate_limiter.allow(client_ip):
+        record_rejection('ip')
+        return {
+            "error": "Rate limit exceeded",
+            "message": f"Maximum {RATE_LIMIT_PER_MINUTE} requests per minute allowed without token. Use an API token for higher limits."
+        }, 429
+
+    logging.info(f"API Request from {client_ip} (no token): {method} {path}")
+    return None
+
+
+def lookup_etag(rnc: str) -> Optional[str]:
+    """Strong ETag of an RNC lookup (version of the data being served plus cleaned RNC).
+
+    Built from memory only, so a 304 never waits on the database. None for
+    malformed RNCs and while no lookup structures are loaded.
+    """
+    clean_rnc = re.sub(r'[^0-9]', '', rnc)
+    version = rnc_service.loaded_version
+    if version is None or not rnc_service.validate_rnc_format(clean_rnc):
+        return None
+    return f"v{version}-{clean_rnc}"
+
+
+def lookup_cache_control() -> str:
+    """Cache-Control header of RNC lookups"""
+    return f"public, max-age={LOOKUP_CACHE_MAX_AGE}"
+
+
+def _not_found_body(rnc: str, result: Optional[Dict]) -> Tuple[Dict, int]:
+    """Error or not-found body of a single RNC lookup"""
+    result = result or {}
+    return {
+        "status": "error" if "error" in result else "not_found",
+        "rnc": result.get("rnc", rnc),
+        "exists": False,
+        **check_fields(result),
+        "message": result.get("message", result.get("error", "RNC not found"))
+    }, 404 if "error" not in result else 400
+
+
+def validate_response(rnc: str) -> Tuple[Dict, int]:
+    """Body of /api/validate/<rnc>"""
+    try:
+        exists, result = rnc_service.validate_rnc(rnc)
+
+        if exists and result:
+            return {
+                "status": "success",
+                "rnc": result["rnc"],
+                "exists": True,
+                **check_fields(result),
+                "message": "RNC found in database"
+            }, 200
+        return _not_found_body(rnc, result)
+
+    except Exception as e:
+        logging.error(f"Error validating RNC {rnc}: {str(e)}")
+        return INTERNAL_ERROR, 500
+
+
+def info_response(rnc: str) -> Tuple[Union[Dict, bytes], int]:
+    """Body of /api/info/<rnc>"""
+    try:
+        # Found records are served from the payload serialized at import time
+        payload, checks = rnc_service.get_info_payload(rnc)
+        if payload is not None:
+            clean_rnc = re.sub(r'[^0-9]', '', rnc)
+            checksum = b'true' if checks["checksum_valid"] else b'false'
+            return (b'{"checksum_valid":' + checksum + b',"data":' + payload +
+                    b',"exists":true,"format_valid":true,"rnc":"' + clean_rnc.encode('ascii') +
+                    b'","status":"success"}\n'), 200
+
+        exists, result = rnc_service.search_rnc(rnc)
+
+        if exists and result:
+            return {
+                "status": "success",
+                "rnc": result["rnc"],
+                "exists": True,
+                **check_fields(result),
+                "data": result["data"]
+            }, 200
+        return _not_found_body(rnc, result)
+
+    except Exception as e:
+        logging.error(f"Error getting RNC info {rnc}: {str(e)}")
+        return INTERNAL_ERROR, 500
+
+
+def status_response() -> Tuple[Dict, int]:
+    """Body of /api/status, built from the cached dataset metadata"""
+    stats = rnc_service.get_database_stats()
+
+    return {
+        "status": "online",
+        "database": stats,
+        "data_version": stats.get("data_version"),
+        "api_version": "1.0.0",
+        "brand": "Four One RNC Validator"
+    }, 200
+
+
+def search_response(data) -> Tuple[Dict, int]:
+    """Body of the /api/search batch lookup for a decoded JSON request body"""
+    try:
+        if not data or 'rncs' not in data:
+            return {
+                "status": "error",
+                "message": "Request body must contain 'rncs' array"
+            }, 400
+
+        rncs = data['rncs']
+
+        if not isinstance(rncs, list):
+            return {
+                "status": "error",
+                "message": "'rncs' must be an array"
+            }, 400
+
+        if len(rncs) > 10:  # Limit batch size
+            return {
+                "status": "error",
+                "message": "Maximum 10 RNCs per batch request"
+            }, 400
+
+        results = []
+        for rnc in rncs:
+            exists, result = rnc_service.search_rnc(str(rnc))
+
+            if exists and result:
+                results.append({
+                    "rnc": result["rnc"],
+                    "exists": True,
+                    **check_fields(result),
+                    "data": result["data"]
+                })
+            else:
+                result = result or {}
+                results.append({
+                    "rnc": result.get("rnc", rnc),
+                    "exists": False,
+                    **check_fields(result),
+                    "message": result.get("message", result.get("error", "RNC not found"))
+                })
+
+        return {
+            "status": "success",
+            "results": results,
+            "total": len(results)
+        }, 200
+
+    except Exception as e:
+        logging.error(f"Error in batch search: {str(e)}")
+        return INTERNAL_ERROR, 500
+
+
+def name_search_response(name_query: Optional[str], limit: int) -> Tuple[Dict, int]:
+    """Body of /api/search-by-name"""
+    try:
+        if not name_query:
+            return {
+                "status": "error",
+                "message": "Query parameter 'q' or 'query' is required"
+            }, 400
+
+        # Validate limit
+        if limit < 1 or limit > 50:
+            limit = 10
+
+        success, result = rnc_service.search_by_name(name_query, limit)
+
+        if success:
+            return {
+                "status": "success",
+                "query": result["query"],
+                "suggestions": result["suggestions"],
+                "total_found": result["total_found"],
+                "message": result["message"]
+            }, 200
+
+        not_found = "No companies found" in result.get("message", "")
+        return {
+            "status": "not_found" if not_found else "error",
+            "query": result.get("query", name_query),
+            "suggestions": result.get("suggestions", []),
+            "total_found": result.get("total_found", 0),
+            "message": result.get("message", result.get("error", "Search failed"))
+        }, 404 if not_found else 400
+
+    except Exception as e:
+        logging.error(f"Error in name search: {str(e)}")
+        return INTERNAL_ERROR, 500
@@ -1,16 +1,40 @@
+import os
+import json
 import logging
-import time
-from flask import Blueprint, request, jsonify, render_template, current_app
+from flask import Blueprint, Response, request, jsonify, render_template, current_app, make_response, send_file, stream_with_context
 from functools import wraps
-from collections import defaultdict
 from rnc_service import rnc_service
-from models import APIToken, db
+from api_handlers import (
+    RATE_LIMIT_PER_MINUTE,
+    authorize_token, authorize_request, lookup_etag, lookup_cache_control,
+    validate_response, info_response, status_response, search_response, name_search_response
+)
+from validation_jobs import validation_job_runner, allowed_validation_file
+from models import ValidationJob, db
 
 api_bp = Blueprint('api', __name__)
 
-# Fallback rate limiting storage for requests without tokens
-request_counts = defaultdict(list)
-RATE_LIMIT_PER_MINUTE = 10  # Reduced for non-token requests
+MAX_BULK_RNCS = 100000  # Largest batch accepted by /api/bulk/validate
+
+def json_response(body, status):
+    """Flask response for a handler result; bytes bodies are already encoded JSON"""
+    if isinstance(body, bytes):
+        return Response(body, status=status, mimetype='application/json')
+    return jsonify(body), status
+
+def get_request_token():
+    """API token from the Authorization header or the token query parameter"""
+    return request.headers.get('Authorization', '').replace('Bearer ', '') or request.args.get('token')
+
+def charge_token(token_value, cost=1):
+    """Authenticate a token and reserve ``cost`` requests from its quota.
+
+    Returns (token, None) on success or (None, error_response) otherwise.
+    """
+    token, error = authorize_token(token_value, cost)
+    if error:
+        return None, json_response(*error)
+    return token, None
 
 def token_or_rate_limit(f):
     """Enhanced rate limiting with token support"""
@@ -18,55 +42,10 @@ def token_or_rate_limit(f):
     def decorated_function(*args, **kwargs):
         client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
         
-        # Check for API token in headers or query params
-        token_value = request.headers.get('Authorization', '').replace('Bearer ', '') or request.args.get('token')
-        
-        if token_value:
-            # Token-based rate limiting
-            token = APIToken.query.filter_by(token=token_value, is_active=True).first()
-            
-            if not token:
-                return jsonify({
-                    "error": "Invalid token",
-                    "message": "The provided API token is invalid or inactive"
-                }), 401
-            
-            if token.is_expired():
-                return jsonify({
-                    "error": "Token expired",
-                    "message": "The provided API token has expired"
-                }), 401
-            
-            if not token.can_make_request():
-                return jsonify({
-                    "error": "Rate limit exceeded",
-                    "message": f"Token rate limit exceeded. Maximum {token.requests_per_hour} requests per hour allowed"
-                }), 429
-            
-            # Use the request
-            token.use_request()
-            logging.info(f"API Request from {client_ip} with token {token.name}: {request.method} {request.path}")
-            
-        else:
-            # IP-based rate limiting for requests without tokens
-            current_time = time.time()
-            
-            # Clean old requests (older than 1 minute)
-            request_counts[client_ip] = [
-                req_time for req_time in request_counts[client_ip] 
-                if current_time - req_time < 60
-            ]
-            
-            # Check if rate limit exceeded
-            if len(request_counts[client_ip]) >= RATE_LIMIT_PER_MINUTE:
-                return jsonify({
-                    "error": "Rate limit exceeded",
-                    "message": f"Maximum {RATE_LIMIT_PER_MINUTE} requests per minute allowed without token. Use an API token for higher limits."
-                }), 429
-            
-            # Add current request
-            request_counts[client_ip].append(current_time)
-            logging.info(f"API Request from {client_ip} (no token): {request.method} {request.path}")
+        # Token quota when a token is given, per-IP limit otherwise
+        error = authorize_request(client_ip, get_request_token(), request.method, request.path)
+        if error:
+            return json_response(*error)
         
         return f(*args, **kwargs)
     return decorated_function
@@ -75,6 +54,31 @@ def rate_limit(max_requests=RATE_LIMIT_PER_MINUTE):
     """Legacy rate limiting decorator for backward compatibility"""
     return token_or_rate_limit
 
+def conditional_lookup(f):
+    """ETag and Cache-Control for RNC lookups, answering If-None-Match with 304.
+
+    Lookup results only change when new data is loaded, so the strong ETag
+    is the loaded data version plus the cleaned RNC and a matching
+    If-None-Match is answered before the lookup runs.
+    """
+    @wraps(f)
+    def decorated_function(rnc, *args, **kwargs):
+        etag = lookup_etag(rnc)
+        if etag is None:
+            return f(rnc, *args, **kwargs)
+        
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(f(rnc, *args, **kwargs))
+            # Found and not-found answers are both stable until the next import
+            if response.status_code not in (200, 404):
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = lookup_cache_control()
+        return response
+    return decorated_function
+
 @api_bp.route('/')
 def index():
     """Main page with API documentation"""
@@ -88,75 +92,34 @@ def documentation():
 
 @api_bp.route('/api/validate/<rnc>', methods=['GET'])
 @rate_limit()
+@conditional_lookup
 def validate_rnc(rnc):
     """Validate if an RNC exists in the database"""
-    try:
-        exists, result = rnc_service.search_rnc(rnc)
-        
-        if exists and result:
-            return jsonify({
-                "status": "success",
-                "rnc": result["rnc"],
-                "exists": True,
-                "message": "RNC found in database"
-            })
-        else:
-            result = result or {}
-            return jsonify({
-                "status": "error" if "error" in result else "not_found",
-                "rnc": result.get("rnc", rnc),
-                "exists": False,
-                "message": result.get("message", result.get("error", "RNC not found"))
-            }), 404 if "error" not in result else 400
-            
-    except Exception as e:
-        logging.error(f"Error validating RNC {rnc}: {str(e)}")
-        return jsonify({
-            "status": "error",
-            "message": "Internal server error"
-        }), 500
+    return json_response(*validate_response(rnc))
 
 @api_bp.route('/api/info/<rnc>', methods=['GET'])
 @rate_limit()
+@conditional_lookup
 def get_rnc_info(rnc):
     """Get complete information for an RNC"""
-    try:
-        exists, result = rnc_service.search_rnc(rnc)
-        
-        if exists and result:
-            return jsonify({
-                "status": "success",
-                "rnc": result["rnc"],
-                "exists": True,
-                "data": result["data"]
-            })
-        else:
-            result = result or {}
-            return jsonify({
-                "status": "error" if "error" in result else "not_found",
-                "rnc": result.get("rnc", rnc),
-                "exists": False,
-                "message": result.get("message", result.get("error", "RNC not found"))
-            }), 404 if "error" not in result else 400
-            
-    except Exception as e:
-        logging.error(f"Error getting RNC info {rnc}: {str(e)}")
-        return jsonify({
-            "status": "error",
-            "message": "Internal server error"
-        }), 500
+    return json_response(*info_response(rnc))
 
 @api_bp.route('/api/status', methods=['GET'])
 def api_status():
-    """Get API and database status"""
-    stats = rnc_service.get_database_stats()
-    
+    """Get API and database status from the cached dataset metadata"""
+    return json_response(*status_response())
+
+@api_bp.route('/api/ready', methods=['GET'])
+def api_ready():
+    """Readiness probe: 200 once this worker has its lookup structures loaded, 503 before"""
+    index = rnc_service.index
+    ready = rnc_service.ready
     return jsonify({
-        "status": "online",
-        "database": stats,
-        "api_version": "1.0.0",
-        "brand": "Four One RNC Validator"
-    })
+        "status": "ready" if ready else "starting",
+        "snapshot_loaded": rnc_service.snapshot is not None,
+        "indexed_records": len(index) if index is not None else 0,
+        "data_version": rnc_service.dataset_info["data_version"] if rnc_service.dataset_info else None
+    }), 200 if ready else 503
 
 @api_bp.route('/api/search', methods=['POST'])
 @rate_limit(30)  # Lower rate limit for search endpoint
@@ -164,101 +127,168 @@ def search_rncs():
     """Batch search for multiple RNCs"""
     try:
         data = request.get_json()
-        
-        if not data or 'rncs' not in data:
-            return jsonify({
-                "status": "error",
-                "message": "Request body must contain 'rncs' array"
-            }), 400
-        
-        rncs = data['rncs']
-        
-        if not isinstance(rncs, list):
-            return jsonify({
-                "status": "error",
-                "message": "'rncs' must be an array"
-            }), 400
-        
-        if len(rncs) > 10:  # Limit batch size
-            return jsonify({
-                "status": "error",
-                "message": "Maximum 10 RNCs per batch request"
-            }), 400
-        
-        results = []
-        for rnc in rncs:
-            exists, result = rnc_service.search_rnc(str(rnc))
-            
-            if exists and result:
-                results.append({
-                    "rnc": result["rnc"],
-                    "exists": True,
-                    "data": result["data"]
-                })
-            else:
-                result = result or {}
-                results.append({
-                    "rnc": result.get("rnc", rnc),
-                    "exists": False,
-                    "message": result.get("message", result.get("error", "RNC not found"))
-                })
-        
-        return jsonify({
-            "status": "success",
-            "results": results,
-            "total": len(results)
-        })
-        
     except Exception as e:
         logging.error(f"Error in batch search: {str(e)}")
         return jsonify({
             "status": "error",
             "message": "Internal server error"
         }), 500
+    return json_response(*search_response(data))
+
+def parse_bulk_rncs():
+    """Read the RNC list of a bulk request: a JSON array, {"rncs": [...]} or one RNC per line"""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('rncs')
+        if not isinstance(data, list):
+            return None
+        return [str(rnc) for rnc in data]
+    body = request.get_data(as_text=True)
+    return [line.strip() for line in body.splitlines() if line.strip()]
+
+@api_bp.route('/api/bulk/validate', methods=['POST'])
+def bulk_validate():
+    """Validate up to MAX_BULK_RNCS RNCs, streaming one NDJSON line per RNC"""
+    client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+    token_value = get_request_token()
+    if not token_value:
+        return jsonify({
+            "status": "error",
+            "message": "Bulk validation requires an API token"
+        }), 401
+    
+    rncs = parse_bulk_rncs()
+    if rncs is None:
+        return jsonify({
+            "status": "error",
+            "message": "Request body must be a JSON array of RNCs, an object with an 'rncs' array, or one RNC per line"
+        }), 400
+    
+    if not rncs:
+        return jsonify({
+            "status": "error",
+            "message": "No RNCs provided"
+        }), 400
+    
+    if len(rncs) > MAX_BULK_RNCS:
+        return jsonify({
+            "status": "error",
+            "message": f"Maximum {MAX_BULK_RNCS} RNCs per bulk request"
+        }), 413
+    
+    # Every RNC in the batch counts as one request against the token quota
+    token, error_response = charge_token(token_value, cost=len(rncs))
+    if error_response:
+        return error_response
+    logging.info(f"Bulk validation from {client_ip} with token {token.name}: {len(rncs)} RNCs")
+    
+    include_data = request.args.get('include_data', '').lower() in ('1', 'true', 'yes')
+    
+    def generate():
+        try:
+            for result in rnc_service.validate_many(rncs, include_data=include_data):
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logging.error(f"Error in bulk validation: {str(e)}")
+            yield json.dumps({"status": "error", "message": "Internal server error"}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def get_token_job(job_id, token):
+    """Validation job owned by a token, or None"""
+    job = db.session.get(ValidationJob, job_id)
+    if job is None or job.api_token_id != token.id:
+        return None
+    return job
+
+@api_bp.route('/api/validation-jobs', methods=['POST'])
+def create_validation_job():
+    """Upload a CSV or Excel file of counterparties to validate in the background"""
+    token_value = get_request_token()
+    if not token_value:
+        return jsonify({
+            "status": "error",
+            "message": "File validation requires an API token"
+        }), 401
+    
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({
+            "status": "error",
+            "message": "Request must include a 'file' upload"
+        }), 400
+    
+    if not allowed_validation_file(file.filename):
+        return jsonify({
+            "status": "error",
+            "message": "Only .csv, .txt and .xlsx files are supported"
+        }), 400
+    
+    # Every row counts against the token quota, charged as the job validates it
+    token, error_response = charge_token(token_value, cost=0)
+    if error_response:
+        return error_response
+    
+    job = validation_job_runner.submit(current_app._get_current_object(), file, api_token_id=token.id)
+    logging.info(f"Validation job {job.id} submitted with token {token.name}: {job.filename}")
+    return jsonify({
+        "status": "queued",
+        "job": job.to_job_dict(),
+        "status_url": f"/api/validation-jobs/{job.id}",
+        "result_url": f"/api/validation-jobs/{job.id}/result"
+    }), 202
+
+@api_bp.route('/api/validation-jobs/<int:job_id>', methods=['GET'])
+def validation_job_status(job_id):
+    """Progress of a file validation job"""
+    token_value = get_request_token()
+    if not token_value:
+        return jsonify({"status": "error", "message": "API token required"}), 401
+    
+    # Polling is not charged against the quota
+    token, error_response = charge_token(token_value, cost=0)
+    if error_response:
+        return error_response
+    
+    job = get_token_job(job_id, token)
+    if job is None:
+        return jsonify({"status": "error", "message": "Validation job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_job_dict()})
+
+@api_bp.route('/api/validation-jobs/<int:job_id>/result', methods=['GET'])
+def validation_job_result(job_id):
+    """Download the annotated CSV of a finished validation job"""
+    token_value = get_request_token()
+    if not token_value:
+        return jsonify({"status": "error", "message": "API token required"}), 401
+    
+    token, error_response = charge_token(token_value, cost=0)
+    if error_response:
+        return error_response
+    
+    job = get_token_job(job_id, token)
+    if job is None:
+        return jsonify({"status": "error", "message": "Validation job not found"}), 404
+    
+    if job.status != 'success' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({
+            "status": "error",
+            "message": "Validation job result is not ready",
+            "job": job.to_job_dict()
+        }), 409
+    
+    download_name = f"{os.path.splitext(job.filename)[0]}_validado.csv"
+    return send_file(os.path.abspath(job.result_path), mimetype='text/csv',
+                     as_attachment=True, download_name=download_name)
 
 @api_bp.route('/api/search-by-name', methods=['GET'])
 @rate_limit(30)  # Lower rate limit for search endpoint
 def search_by_name():
     """Search companies by name with autocomplete suggestions"""
-    try:
-        name_query = request.args.get('q') or request.args.get('query')
-        limit = request.args.get('limit', 10, type=int)
-        
-        if not name_query:
-            return jsonify({
-                "status": "error",
-                "message": "Query parameter 'q' or 'query' is required"
-            }), 400
-        
-        # Validate limit
-        if limit < 1 or limit > 50:
-            limit = 10
-        
-        success, result = rnc_service.search_by_name(name_query, limit)
-        
-        if success:
-            return jsonify({
-                "status": "success",
-                "query": result["query"],
-                "suggestions": result["suggestions"],
-                "total_found": result["total_found"],
-                "message": result["message"]
-            })
-        else:
-            return jsonify({
-                "status": "not_found" if "No companies found" in result.get("message", "") else "error",
-                "query": result.get("query", name_query),
-                "suggestions": result.get("suggestions", []),
-                "total_found": result.get("total_found", 0),
-                "message": result.get("message", result.get("error", "Search failed"))
-            }), 404 if "No companies found" in result.get("message", "") else 400
-            
-    except Exception as e:
-        logging.error(f"Error in name search: {str(e)}")
-        return jsonify({
-            "status": "error",
-            "message": "Internal server error"
-        }), 500
+    name_query = request.args.get('q') or request.args.get('query')
+    limit = request.args.get('limit', 10, type=int)
+    return json_response(*name_search_response(name_query, limit))
 
 @api_bp.errorhandler(404)
 def not_found(error):
@@ -1,47 +1,203 @@
 import os
+import time
+import atexit
+import signal
 import logging
+import tempfile
+import threading
+from typing import Optional
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize database
-from models import db
-db.init_app(app)
-
-# Create tables and import data
-with app.app_context():
-    db.create_all()
-    
-    # Import RNC data if tables are empty
-    from models import RNCRecord
-    if RNCRecord.query.count() == 0:
-        from data_importer import import_rnc_data
-        import_rnc_data()
-    
-    # Initialize admin user
-    from admin_routes import init_admin_user
-    init_admin_user()
-
-# Import and register routes
-from api_routes import api_bp
-from admin_routes import admin_bp
-
-app.register_blueprint(api_bp)
-app.register_blueprint(admin_bp)
+
+def create_app(warm_up: bool = True) -> Flask:
+    """Create the Flask application.
+
+    Creating the app does no database work: schema setup, the initial DGII
+    load and the admin bootstrap are one-shot CLI commands (see cli.py).
+    Unless ``warm_up`` is false, the first request (usually the load
+    balancer's /api/ready probe) starts loading the lookup structures on a
+    background thread, and /api/ready reports 503 until they are in place.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+    # Initialize database
+    from models import db
+    db.init_app(app)
+
+    # Import and register routes
+    from api_routes import api_bp
+    from admin_routes import admin_bp
+    app.register_blueprint(api_bp)
+    app.register_blueprint(admin_bp)
+
+    # Request, query and cache metrics for the API, served at /metrics
+    import metrics
+    metrics.init_app(app)
+
+    # On-demand cProfile and SQL reports for admins, browsable at /admin/profiles
+    from request_profiler import request_profiler
+    request_profiler.init_app(app)
+
+    from cli import register_commands
+    register_commands(app)
+
+    # Write back any API token usage still buffered in memory on shutdown
+    from token_cache import token_cache
+
+    def flush_token_usage():
+        with app.app_context():
+            token_cache.flush()
+
+    atexit.register(flush_token_usage)
+
+    if warm_up:
+        app.before_request(lambda: ensure_warm_up(app))
+        app.before_request(lambda: ensure_current_data(app))
+    return app
+
+
+def warm_up(app: Flask) -> bool:
+    """Load the snapshot, indexes and dataset metadata for this process"""
+    from models import db
+    from rnc_service import rnc_service
+    with app.app_context():
+        try:
+            ready = rnc_service.warm_up()
+        finally:
+            db.session.remove()
+    if not ready:
+        # Let a later request try again (e.g. once init-db or load-data has run)
+        app.extensions.pop('rnc_warm_up', None)
+    return ready
+
+
+_warm_up_lock = threading.Lock()
+
+
+def ensure_warm_up(app: Flask):
+    """Start warming up on a background thread once per process"""
+    from rnc_service import rnc_service
+    if rnc_service.ready or app.extensions.get('rnc_warm_up'):
+        return
+    with _warm_up_lock:
+        if app.extensions.get('rnc_warm_up'):
+            return
+        thread = threading.Thread(target=warm_up, args=(app,), name='rnc-warm-up', daemon=True)
+        app.extensions['rnc_warm_up'] = thread
+        thread.start()
+
+
+# Seconds between checks for data imported by another process
+DATA_VERSION_CHECK_INTERVAL = int(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 30))
+
+# Set by gunicorn.conf.py in the master, so workers know their data came from a preloaded fork
+PRELOADED_ENV = 'RNC_PRELOADED'
+
+_last_version_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def ensure_current_data(app: Flask):
+    """Pick up a newer import generation, at most every DATA_VERSION_CHECK_INTERVAL seconds.
+
+    Only a snapshot file newer than the loaded data triggers a reload (see
+    RNCService.available_version), so a database version the snapshot has
+    not caught up with does not rebuild the same file over and over.
+    A standalone process rebuilds its lookup structures on a background
+    thread. A worker forked from a preloaded gunicorn master instead asks
+    the master to reload (see gunicorn.conf.py): the master rebuilds the
+    structures once and replaces its workers with fresh forks, so the data
+    stays shared between them instead of being copied into each one. That
+    request waits until no import or validation job is running.
+    """
+    global _last_version_check
+    from rnc_service import rnc_service
+    now = time.monotonic()
+    if not rnc_service.ready or now - _last_version_check < DATA_VERSION_CHECK_INTERVAL:
+        return
+    _last_version_check = now
+    try:
+        version = rnc_service.available_version()
+    except Exception as e:
+        logging.error(f"Could not read the data version: {str(e)}")
+        return
+
+    if os.environ.get(PRELOADED_ENV):
+        if is_newer(version, rnc_service.fork_version) and not jobs_running():
+            request_master_reload(version)
+    elif is_newer(version, rnc_service.loaded_version) and not app.extensions.get('rnc_reload'):
+        with _reload_lock:
+            if app.extensions.get('rnc_reload'):
+                return
+            thread = threading.Thread(target=_reload_in_background, args=(app,), name='rnc-reload', daemon=True)
+            app.extensions['rnc_reload'] = thread
+            thread.start()
+
+
+def is_newer(version: Optional[int], loaded: Optional[int]) -> bool:
+    """Whether a reload would pick up data newer than what is loaded"""
+    return version is not None and (loaded is None or version > loaded)
+
+
+def _reload_in_background(app: Flask):
+    """Rebuild this process's lookup structures from the current snapshot"""
+    from models import db
+    from rnc_service import rnc_service
+    try:
+        with app.app_context():
+            try:
+                rnc_service.reload()
+                logging.info(f"Lookup structures reloaded for data version {rnc_service.loaded_version}")
+            finally:
+                db.session.remove()
+    except Exception as e:
+        logging.error(f"Reload failed: {str(e)}")
+    finally:
+        app.extensions.pop('rnc_reload', None)
+
+
+def jobs_running() -> bool:
+    """Whether background jobs are active; a master reload would kill the workers running them"""
+    from models import active_job_count
+    try:
+        active = active_job_count()
+    except Exception as e:
+        logging.error(f"Could not check for running jobs: {str(e)}")
+        return True
+    if active:
+        logging.info(f"Deferring reload until {active} background job(s) finish")
+    return bool(active)
+
+
+def request_master_reload(version: int) -> bool:
+    """Send SIGHUP to the gunicorn master once per data version, whichever worker notices first"""
+    master_pid = os.getppid()
+    marker = os.path.join(tempfile.gettempdir(), f"rnc-reload-{master_pid}-v{version}")
+    try:
+        fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    logging.info(f"Data version {version} available; asking gunicorn master {master_pid} to reload")
+    os.kill(master_pid, signal.SIGHUP)
+    return True
+
+
+# Application instance used by gunicorn (main:app) and the async server
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+from api_handlers import (
+    authorize_request, lookup_etag, lookup_cache_control,
+    validate_response, info_response, status_response, search_response, name_search_response
+)
+import metrics
+
+# Request limits
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 75  # seconds an idle connection is kept open
+
+REASONS = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+    429: 'Too Many Requests', 500: 'Internal Server Error',
+}
+
+ROUTES = [
+    (re.compile(r'^/api/validate/([^/]+)$'), 'GET', 'validate'),
+    (re.compile(r'^/api/info/([^/]+)$'), 'GET', 'info'),
+    (re.compile(r'^/api/search$'), 'POST', 'search'),
+    (re.compile(r'^/api/search-by-name$'), 'GET', 'search_by_name'),
+    (re.compile(r'^/api/status$'), 'GET', 'status'),
+]
+
+# Route labels of the metrics, matching the Flask URL rules
+ROUTE_LABELS = {
+    'validate': '/api/validate/<rnc>',
+    'info': '/api/info/<rnc>',
+    'search': '/api/search',
+    'search_by_name': '/api/search-by-name',
+    'status': '/api/status',
+}
+
+NOT_FOUND = ({"status": "error", "message": "Endpoint not found"}, 404)
+METHOD_NOT_ALLOWED = ({"status": "error", "message": "Method not allowed"}, 405)
+
+
+def encode_json(body: Union[Dict, bytes]) -> bytes:
+    """Encode a handler body the way Flask's jsonify does"""
+    if isinstance(body, bytes):
+        return body
+    return (json.dumps(body, sort_keys=True, separators=(',', ':'), ensure_ascii=True) + '\n').encode('ascii')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches a strong ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == f'"{etag}"':
+            return True
+    return False
+
+
+class Request:
+    """A parsed HTTP/1.1 request"""
+
+    __slots__ = ('method', 'path', 'query', 'version', 'headers', 'body', 'client_ip')
+
+    def __init__(self, method, path, query, version, headers, body, client_ip):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.client_ip = client_ip
+
+    def arg(self, name: str) -> Optional[str]:
+        """First value of a query string parameter"""
+        values = self.query.get(name)
+        return values[0] if values else None
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class AsyncAPIServer:
+    """asyncio HTTP server for the read-only lookup API.
+
+    Serves /api/validate, /api/info, /api/search, /api/search-by-name and
+    /api/status with the same JSON bodies, ETags and token/IP limits as the
+    Flask blueprint, through the handlers in api_handlers. Connections are
+    coroutines, so thousands of idle keep-alive clients or slow readers cost
+    no threads. Lookups are answered from the in-process snapshot and
+    indexes; the handler call runs on a small thread pool with an application
+    context because token checks and the no-snapshot fallback may still
+    query the database, which must never block the event loop.
+    """
+
+    def __init__(self, app, host: str = '0.0.0.0', port: int = 8000, handler_threads: int = 8):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=handler_threads, thread_name_prefix='async-api')
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                            limit=MAX_HEADER_BYTES, backlog=2048)
+        logging.info(f"Async API server listening on {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        peer_ip = peer[0] if peer else ''
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer, peer_ip), KEEP_ALIVE_TIMEOUT)
+                except ValueError as e:
+                    status = e.args[1] if len(e.args) > 1 else 400
+                    await self._write(writer, {"status": "error", "message": str(e.args[0])}, status, False)
+                    break
+                if request is None:
+                    break
+
+                body, status, headers = await self._dispatch(request)
+                await self._write(writer, body, status, request.keep_alive, headers)
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logging.error(f"Async API connection error: {str(e)}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                            peer_ip: str) -> Optional[Request]:
+        """Read one request; None when the client closed the connection"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise ValueError('Request headers too large', 400)
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise ValueError('Malformed request line', 400)
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        if 'transfer-encoding' in headers:
+            raise ValueError('Chunked request bodies are not supported; send Content-Length', 411)
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise ValueError('Invalid Content-Length', 400)
+        if length > MAX_BODY_BYTES:
+            raise ValueError('Request body too large', 413)
+        if length:
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            body = await reader.readexactly(length)
+
+        url = urlsplit(target)
+        client_ip = headers.get('x-forwarded-for') or peer_ip
+        return Request(method.upper(), unquote(url.path), parse_qs(url.query, keep_blank_values=True),
+                       version, headers, body, client_ip)
+
+    async def _dispatch(self, request: Request) -> Tuple[Union[Dict, bytes], int, Dict]:
+        """Route a request and run its handler off the event loop"""
+        path_matched = False
+        for pattern, method, name in ROUTES:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            path_matched = True
+            if request.method != method:
+                continue
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._run_handler, name, request, match.groups())
+        body, status = METHOD_NOT_ALLOWED if path_matched else NOT_FOUND
+        return body, status, {}
+
+    def _run_handler(self, name: str, request: Request, params: tuple) -> Tuple[Union[Dict, bytes], int, Dict]:
+        """Execute a handler inside an application context (worker thread)"""
+        from models import db
+        from app import ensure_current_data
+
+        started = time.perf_counter()
+        metrics.begin_request()
+        with self.app.app_context():
+            try:
+                ensure_current_data(self.app)
+                result = self._handle(name, request, params)
+            except Exception as e:
+                logging.error(f"Async API error on {request.path}: {str(e)}")
+                result = {"status": "error", "message": "Internal server error"}, 500, {}
+            finally:
+                db.session.remove()
+        metrics.end_request(ROUTE_LABELS[name], request.method, result[1], time.perf_counter() - started)
+        return result
+
+    def _handle(self, name: str, request: Request, params: tuple) -> Tuple[Union[Dict, bytes], int, Dict]:
+        """Rate limiting, conditional GET and the shared handler for one route"""
+        if name == 'status':
+            return (*status_response(), {})
+
+        token_value = request.headers.get('authorization', '').replace('Bearer ', '') or request.arg('token')
+        error = authorize_request(request.client_ip, token_value, request.method, request.path)
+        if error:
+            return (*error, {})
+
+        if name in ('validate', 'info'):
+            rnc = params[0]
+            handler = validate_response if name == 'validate' else info_response
+            etag = lookup_etag(rnc)
+            if etag is None:
+                return (*handler(rnc), {})
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': lookup_cache_control()}
+            if etag_matches(request.headers.get('if-none-match'), etag):
+                return b'', 304, headers
+            body, status = handler(rnc)
+            # Found and not-found answers are both stable until the next import
+            return body, status, headers if status in (200, 404) else {}
+
+        if name == 'search':
+            try:
+                if 'json' not in request.headers.get('content-type', ''):
+                    raise ValueError('Request body must be JSON')
+                data = json.loads(request.body)
+            except ValueError as e:
+                logging.error(f"Error in batch search: {str(e)}")
+                return {"status": "error", "message": "Internal server error"}, 500, {}
+            return (*search_response(data), {})
+
+        name_query = request.arg('q') or request.arg('query')
+        try:
+            limit = int(request.arg('limit') or 10)
+        except ValueError:
+            limit = 10
+        return (*name_search_response(name_query, limit), {})
+
+    async def _write(self, writer: asyncio.StreamWriter, body: Union[Dict, bytes], status: int,
+                     keep_alive: bool, headers: Optional[Dict] = None):
+        """Send a response"""
+        payload = b'' if status == 304 else encode_json(body)
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        if status != 304:
+            lines.append('Content-Type: application/json')
+        lines.append(f'Content-Length: {len(payload)}')
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+
+def main():
+    from app import app, ensure_warm_up
+    ensure_warm_up(app)
+
+    server = AsyncAPIServer(
+        app,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('ASYNC_PORT', os.environ.get('PORT', 8000))),
+        handler_threads=int(os.environ.get('ASYNC_HANDLER_THREADS', 8))
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+"""Benchmark of the lookup API.
+
+Generates (or reuses) a synthetic DGII file, loads it into a local SQLite
+database, or a PostgreSQL one given with --database-url, then replays
+deterministic request mixes against the Flask app. The app runs in
+process through its test client by default; with --url a running server
+is benchmarked over HTTP keep-alive connections. Throughput and latency
+percentiles per scenario are written to a JSON file, and --baseline
+prints the change against an earlier run.
+
+    python benchmarks/bench_api.py --size medium
+    python benchmarks/bench_api.py --rows 10000 --scenarios info-hot,not-found --concurrency 8
+    python benchmarks/bench_api.py --size medium --baseline benchmarks/results/api_1a2b3c4_100000.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import (SIZES, COMPANY_PREFIXES, LAST_NAMES, write_dataset, read_identifiers)
+
+# (method, path, headers, body)
+Request = Tuple[str, str, Dict[str, str], Optional[bytes]]
+
+HOT_SET_SIZE = 200
+TOKEN_COUNT = 20
+TOKEN_PREFIX = 'benchmark-'
+
+
+# Scenarios ------------------------------------------------------------------
+
+def _anonymous(i: int) -> Dict[str, str]:
+    """Headers of an anonymous client; every request gets its own IP so the per-IP limit never trips"""
+    return {'X-Forwarded-For': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"}
+
+
+def _missing_rnc(rng: random.Random, known: set) -> str:
+    while True:
+        rnc = str(rng.randrange(10 ** 8, 10 ** 9)) if rng.random() < 0.5 else f"{rng.randrange(10 ** 11):011d}"
+        if rnc not in known:
+            return rnc
+
+
+def validate_hot(ids, known, rng, count, tokens):
+    hot = rng.sample(ids, min(HOT_SET_SIZE, len(ids)))
+    return [('GET', f"/api/validate/{rng.choice(hot)}", _anonymous(i), None) for i in range(count)]
+
+
+def info_hot(ids, known, rng, count, tokens):
+    hot = rng.sample(ids, min(HOT_SET_SIZE, len(ids)))
+    return [('GET', f"/api/info/{rng.choice(hot)}", _anonymous(i), None) for i in range(count)]
+
+
+def info_cold(ids, known, rng, count, tokens):
+    sample = rng.sample(ids, min(count, len(ids)))
+    return [('GET', f"/api/info/{rnc}", _anonymous(i), None) for i, rnc in enumerate(sample)]
+
+
+def not_found(ids, known, rng, count, tokens):
+    requests = []
+    for i in range(count):
+        rnc = _missing_rnc(rng, known) if rng.random() < 0.9 else rng.choice(('ABC123', '12345', '0', 'RNC-1-01'))
+        requests.append(('GET', f"/api/validate/{rnc}", _anonymous(i), None))
+    return requests
+
+
+def search_batch(ids, known, rng, count, tokens):
+    requests = []
+    for i in range(count):
+        rncs = rng.sample(ids, 8) + [_missing_rnc(rng, known) for _ in range(2)]
+        headers = dict(_anonymous(i), **{'Content-Type': 'application/json'})
+        requests.append(('POST', '/api/search', headers, json.dumps({'rncs': rncs}).encode()))
+    return requests
+
+
+def name_prefix(ids, known, rng, count, tokens):
+    # Type-ahead traffic: many clients typing the same common words letter by letter
+    words = COMPANY_PREFIXES + LAST_NAMES
+    requests = []
+    while len(requests) < count:
+        word = rng.choice(words)
+        for end in range(2, len(word) + 1):
+            i = len(requests)
+            requests.append(('GET', f"/api/search-by-name?q={quote(word[:end])}&limit=10", _anonymous(i), None))
+    return requests[:count]
+
+
+def token_auth(ids, known, rng, count, tokens):
+    return [('GET', f"/api/validate/{rng.choice(ids)}", {'Authorization': f"Bearer {rng.choice(tokens)}"}, None)
+            for _ in range(count)]
+
+
+# name: (builder, clear caches first, description)
+SCENARIOS: Dict[str, Tuple[Callable, bool, str]] = {
+    'validate-hot': (validate_hot, False, f"/api/validate over {HOT_SET_SIZE} repeated RNCs"),
+    'info-hot': (info_hot, False, f"/api/info over {HOT_SET_SIZE} repeated RNCs"),
+    'info-cold': (info_cold, True, '/api/info for distinct RNCs with empty caches'),
+    'not-found': (not_found, True, '/api/validate with 90% unknown and 10% malformed RNCs'),
+    'search-batch': (search_batch, True, 'POST /api/search with 8 known and 2 unknown RNCs'),
+    'name-prefix': (name_prefix, True, '/api/search-by-name type-ahead prefixes'),
+    'token-auth': (token_auth, False, f"/api/validate with {TOKEN_COUNT} rotating API tokens"),
+}
+
+
+# Clients --------------------------------------------------------------------
+
+class InProcessClient:
+    """Calls the Flask app directly through its test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body) -> int:
+        response = self.client.open(path, method=method, headers=headers, data=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPClient:
+    """Keep-alive HTTP connection to a running server"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.connection = None
+
+    def request(self, method, path, headers, body) -> int:
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+# Running --------------------------------------------------------------------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_requests(requests: List[Request], client_factory: Callable, concurrency: int) -> Dict:
+    """Replay requests on ``concurrency`` threads and summarize latency and status codes"""
+    local = threading.local()
+
+    def call(request: Request):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = client_factory()
+        start = time.perf_counter()
+        try:
+            status = client.request(*request)
+        except Exception:
+            status = 0
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, requests, chunksize=64))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    statuses: Dict[str, int] = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+        'status_codes': statuses,
+    }
+
+
+def clear_caches():
+    """Empty the in-process lookup caches (in-process mode only)"""
+    from rnc_service import rnc_service
+    rnc_service.result_cache.clear()
+
+
+# Setup ----------------------------------------------------------------------
+
+def prepare_dataset(args) -> str:
+    rows = args.rows or SIZES[args.size]
+    path = args.data_file or os.path.join(BENCH_DIR, 'data', f"dgii_{rows}_{args.seed}.txt")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        write_dataset(path, rows, args.seed)
+        logging.warning(f"Generated {rows:,} records in {time.perf_counter() - started:.1f}s: {path}")
+    return path
+
+
+def prepare_app(args, data_file: str) -> Tuple[object, Dict]:
+    """Point the app at the benchmark database and snapshot, load the data and warm up"""
+    stem = os.path.splitext(os.path.basename(data_file))[0]
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(BENCH_DIR, 'data', stem + '.sqlite')}"
+    os.environ['RNC_SNAPSHOT_PATH'] = os.path.join(BENCH_DIR, 'data', stem + '.snapshot')
+    os.environ.pop('RATE_LIMIT_DB', None)
+
+    from app import create_app, warm_up
+    from cli import init_db, load_data
+    from models import db, RNCRecord
+
+    app = create_app(warm_up=False)
+    setup = {}
+    with app.app_context():
+        init_db()
+        started = time.perf_counter()
+        if not load_data(data_file, if_empty=True):
+            raise SystemExit(f"Could not import {data_file}")
+        setup['load_seconds'] = round(time.perf_counter() - started, 2)
+        setup['records'] = db.session.query(RNCRecord.id).count()
+        db.session.remove()
+    if not warm_up(app):
+        raise SystemExit('Warm-up failed')
+    return app, setup
+
+
+def benchmark_tokens(app) -> List[str]:
+    """API tokens with an effectively unlimited quota, created on first use"""
+    from models import db, APIToken
+    with app.app_context():
+        tokens = APIToken.query.filter(APIToken.name.like(f"{TOKEN_PREFIX}%")).all()
+        for i in range(len(tokens), TOKEN_COUNT):
+            token = APIToken(token=APIToken.generate_token(), name=f"{TOKEN_PREFIX}{i}",
+                             requests_per_hour=10 ** 9, created_by='benchmark')
+            db.session.add(token)
+            tokens.append(token)
+        db.session.commit()
+        values = [token.token for token in tokens]
+        db.session.remove()
+    return values
+
+
+def git_revision() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    previous = (baseline or {}).get('scenarios', {})
+    print(f"{'scenario':<14} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}  {'status codes'}")
+    for name, result in report['scenarios'].items():
+        line = (f"{name:<14} {result['throughput_rps']:>10.1f} {result['latency_ms']['p50']:>9.3f} "
+                f"{result['latency_ms']['p99']:>9.3f}  {result['status_codes']}")
+        old = previous.get(name)
+        if old and old['throughput_rps']:
+            rps_change = (result['throughput_rps'] / old['throughput_rps'] - 1) * 100
+            p99_change = (result['latency_ms']['p99'] / old['latency_ms']['p99'] - 1) * 100 if old['latency_ms']['p99'] else 0.0
+            line += f"  [req/s {rps_change:+.1f}%, p99 {p99_change:+.1f}% vs {baseline['meta']['revision']}]"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the RNC lookup API.')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--rows', type=int, help='Records in the generated dataset.')
+    size.add_argument('--size', choices=sorted(SIZES), default='small',
+                      help='Preset dataset size: small=10k, medium=100k, large=1M rows.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the dataset and request mixes.')
+    parser.add_argument('--data-file', help='Use this DGII file instead of generating one.')
+    parser.add_argument('--database-url', help='Database to load (default: SQLite file in benchmarks/data).')
+    parser.add_argument('--url', help='Benchmark a running server at this base URL instead of the app in process.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}.")
+    parser.add_argument('--requests', type=int, default=2000, help='Measured requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=200, help='Unmeasured requests before warm scenarios.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads.')
+    parser.add_argument('--output', help='JSON report path (default: benchmarks/results/api_<revision>_<rows>.json).')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against.')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    # Per-request INFO lines would measure the terminal, not the API
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    data_file = prepare_dataset(args)
+    app, setup = prepare_app(args, data_file)
+    tokens = benchmark_tokens(app)
+    ids = read_identifiers(data_file)
+    known = set(ids)
+
+    if args.url:
+        client_factory = lambda: HTTPClient(args.url)
+    else:
+        client_factory = lambda: InProcessClient(app)
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'mode': f"http {args.url}" if args.url else 'in-process',
+            'dataset': {'file': os.path.basename(data_file), 'rows': len(ids), 'seed': args.seed, **setup},
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'warmup_requests': args.warmup,
+        },
+        'scenarios': {},
+    }
+
+    for name in names:
+        builder, cold, description = SCENARIOS[name]
+        rng = random.Random(f"{args.seed}-{name}")
+        requests = builder(ids, known, rng, args.requests + (0 if cold else args.warmup), tokens)
+        if cold:
+            if not args.url:
+                clear_caches()
+        elif args.warmup:
+            run_requests(requests[:args.warmup], client_factory, args.concurrency)
+            requests = requests[args.warmup:]
+        result = run_requests(requests, client_factory, args.concurrency)
+        result['description'] = description
+        report['scenarios'][name] = result
+
+    # Write back the token usage buffered during the run
+    from token_cache import token_cache
+    with app.app_context():
+        token_cache.flush()
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"api_{revision}_{len(ids)}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+    print_report(report, baseline)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Benchmark of the DGII importer.
+
+For each dataset size, runs three imports against a fresh database:
+``initial`` loads the generated file into an empty table, ``unchanged``
+re-imports the same file (hash diff only, nothing written), and
+``changed`` imports a copy where every 20th record changed estado.
+Every size runs in its own process, so peak RSS and module state do not
+leak between sizes. The per-stage profile of every import is written to
+a JSON file.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --sizes 10000,100000,1000000
+    python benchmarks/bench_import.py --sizes 100000 --database-url postgresql://localhost/rnc_bench
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import generate_rows, write_dataset
+from bench_api import git_revision
+
+DEFAULT_SIZES = '10000,50000,100000'
+CHANGE_EVERY = 20
+SCENARIOS = ('initial', 'unchanged', 'changed')
+
+
+def write_changed_dataset(path: str, rows: int, seed: int) -> str:
+    """Same records as write_dataset(rows, seed), with every CHANGE_EVERY-th estado changed"""
+    with open(path, 'w', encoding='cp1252', newline='') as handle:
+        for position, record in enumerate(generate_rows(rows, seed)):
+            if position % CHANGE_EVERY == 0:
+                record[9] = 'SUSPENDIDO' if record[9] == 'ACTIVO' else 'ACTIVO'
+            handle.write('|'.join(record) + '\r\n')
+    return path
+
+
+def run_size(rows: int, seed: int, database_url: str, workdir: str) -> Dict:
+    """Run the import scenarios for one size (in the current process)"""
+    data_dir = os.path.join(BENCH_DIR, 'data')
+    original = os.path.join(data_dir, f"dgii_{rows}_{seed}.txt")
+    if not os.path.exists(original):
+        write_dataset(original, rows, seed)
+    changed = write_changed_dataset(os.path.join(workdir, f"dgii_{rows}_{seed}_changed.txt"), rows, seed)
+
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'import.sqlite')}"
+    os.environ['RNC_SNAPSHOT_PATH'] = os.path.join(workdir, 'import.snapshot')
+
+    from app import create_app
+    from cli import init_db
+    from models import db, RNCRecord
+    from data_importer import DataImporter
+
+    app = create_app(warm_up=False)
+    results = {}
+    with app.app_context():
+        init_db()
+        if database_url:
+            # Start from an empty table on a shared database too
+            db.session.query(RNCRecord).delete()
+            db.session.commit()
+        files = {'initial': original, 'unchanged': original, 'changed': changed}
+        for scenario in SCENARIOS:
+            stats = DataImporter().import_from_file(files[scenario], update_existing=True)
+            profile = stats.pop('profile')
+            results[scenario] = {
+                'rows': stats['total_processed'],
+                'new': stats['new'],
+                'updated': stats['updated'],
+                'unchanged': stats['unchanged'],
+                'errors': stats['errors'],
+                'rows_per_second': round(stats['total_processed'] / profile['total_seconds'])
+                if profile['total_seconds'] else None,
+                'profile': profile,
+            }
+            db.session.remove()
+    return results
+
+
+def slowest_stage(profile: Dict) -> str:
+    stages = profile['stages']
+    if not stages:
+        return '-'
+    name = max(stages, key=lambda stage: stages[stage]['seconds'])
+    return f"{name} ({stages[name]['share']:.0f}%)"
+
+
+def print_report(report: Dict):
+    print(f"{'rows':>10} {'scenario':<10} {'seconds':>9} {'rows/s':>10} {'peak RSS MB':>12}  slowest stage")
+    for size, scenarios in report['sizes'].items():
+        for scenario, result in scenarios.items():
+            profile = result['profile']
+            print(f"{int(size):>10,} {scenario:<10} {profile['total_seconds']:>9.2f} "
+                  f"{result['rows_per_second'] or 0:>10,} {profile['peak_rss_mb'] or 0:>12.1f}  {slowest_stage(profile)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DGII importer at increasing file sizes.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated dataset sizes (rows).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Database to import into (default: a fresh SQLite file per size).')
+    parser.add_argument('--output', help='JSON report path (default: benchmarks/results/import_<revision>.json).')
+    parser.add_argument('--worker-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.worker_size:
+        # Child process: run one size and print its results as JSON
+        workdir = tempfile.mkdtemp(prefix='rnc-import-bench-')
+        try:
+            results = run_size(args.worker_size, args.seed, args.database_url, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(results))
+        return
+
+    sizes: List[int] = [int(size) for size in args.sizes.split(',') if size.strip()]
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': (args.database_url or 'sqlite').split(':', 1)[0],
+            'seed': args.seed,
+            'changed_share': round(1 / CHANGE_EVERY, 3),
+        },
+        'sizes': {},
+    }
+
+    for size in sizes:
+        command = [sys.executable, os.path.abspath(__file__), '--worker-size', str(size), '--seed', str(args.seed)]
+        if args.database_url:
+            command += ['--database-url', args.database_url]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stderr)
+            raise SystemExit(f"Import benchmark failed for {size:,} rows")
+        report['sizes'][str(size)] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"import_{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+    print_report(report)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Synthetic DGII RNC files for benchmarks.
+
+Writes the same 11-column, pipe-delimited, cp1252 layout as the official
+DGII download: RNCs of companies (9 digits, DGII modulus-11 check digit)
+and cédulas of individuals (11 digits, Luhn check digit), Spanish company
+and personal names, economic activities, estados and regímenes in roughly
+the proportions of the real file. Output is fully determined by the seed.
+
+    python benchmarks/generate_dataset.py --rows 100000 --output /tmp/dgii_100k.txt
+    python benchmarks/generate_dataset.py --size large    # 1M rows
+"""
+import os
+import sys
+import random
+import argparse
+from typing import Iterator, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from check_digit import rnc_check_digit, cedula_check_digit
+
+SIZES = {'small': 10_000, 'medium': 100_000, 'large': 1_000_000}
+
+COMPANY_PREFIXES = [
+    'COMERCIAL', 'CONSTRUCTORA', 'INVERSIONES', 'DISTRIBUIDORA', 'FARMACIA', 'FERRETERIA',
+    'GRUPO', 'SERVICIOS', 'TRANSPORTE', 'IMPORTADORA', 'INMOBILIARIA', 'AGROINDUSTRIAL',
+    'CONSULTORES', 'SUPERMERCADO', 'COLMADO', 'TALLER', 'LABORATORIO', 'CLINICA',
+]
+COMPANY_WORDS = [
+    'CARIBE', 'ANTILLAS', 'QUISQUEYA', 'CIBAO', 'DEL ESTE', 'DEL SUR', 'SANTO DOMINGO',
+    'LA ROMANA', 'SAN CRISTOBAL', 'BAVARO', 'NACIONAL', 'DOMINICANA', 'TROPICAL', 'PEÑA',
+    'NUÑEZ', 'ÁLVAREZ', 'HERMANOS', 'Y ASOCIADOS', 'GLOBAL', 'MODERNA', 'INTEGRAL', 'UNIDOS',
+    'DEL CARMEN', 'LOS MINA', 'MONTAÑA', 'ATLÁNTICO', 'CONSTRUCCIONES', 'TECNOLOGÍA',
+]
+LEGAL_FORMS = ['SRL', 'SRL', 'SRL', 'SA', 'SAS', 'EIRL', 'C POR A']
+FIRST_NAMES = [
+    'JUAN', 'MARIA', 'JOSE', 'ANA', 'LUIS', 'CARMEN', 'PEDRO', 'ROSA', 'RAFAEL', 'MARTHA',
+    'FRANCISCO', 'JOSEFINA', 'MIGUEL', 'ALTAGRACIA', 'RAMON', 'YOLANDA', 'ANGEL', 'MERCEDES',
+]
+LAST_NAMES = [
+    'PEREZ', 'RODRIGUEZ', 'MARTINEZ', 'GOMEZ', 'FERNANDEZ', 'DIAZ', 'REYES', 'NUÑEZ',
+    'MEJIA', 'SANTANA', 'PEÑA', 'JIMENEZ', 'CASTILLO', 'DE LA CRUZ', 'ALMONTE', 'BÁEZ',
+]
+ACTIVITIES = [
+    'VENTA AL POR MENOR EN COLMADOS', 'CONSTRUCCION DE EDIFICIOS', 'SERVICIOS DE TRANSPORTE DE CARGA',
+    'ACTIVIDADES INMOBILIARIAS', 'VENTA AL POR MAYOR DE ALIMENTOS', 'SERVICIOS DE CONSULTORIA',
+    'RESTAURANTES Y CAFETERIAS', 'VENTA DE PRODUCTOS FARMACEUTICOS', 'ALQUILER DE VIVIENDAS',
+    'REPARACION DE VEHICULOS', 'OTRAS ACTIVIDADES DE SERVICIOS',
+]
+ESTADOS = ['ACTIVO'] * 14 + ['SUSPENDIDO'] * 3 + ['DADO DE BAJA'] * 2 + ['CESE TEMPORAL', 'ANULADO']
+REGIMENES = ['NORMAL'] * 8 + ['RST', 'ESPECIAL']
+
+def company_name(rng: random.Random) -> str:
+    words = rng.sample(COMPANY_WORDS, rng.choice((1, 1, 2)))
+    return ' '.join([rng.choice(COMPANY_PREFIXES)] + words + [rng.choice(LEGAL_FORMS)])
+
+
+def person_name(rng: random.Random) -> str:
+    return ' '.join(rng.sample(FIRST_NAMES, rng.choice((1, 2))) + rng.sample(LAST_NAMES, 2))
+
+
+def generate_rows(rows: int, seed: int = 42, cedula_share: float = 0.45) -> Iterator[List[str]]:
+    """Yield ``rows`` DGII records with unique, checksum-valid identifiers"""
+    rng = random.Random(seed)
+    seen = set()
+    while len(seen) < rows:
+        if rng.random() < cedula_share:
+            base = f"{rng.choice(('001', '002', '031', '047', '223', '402'))}{rng.randrange(10 ** 7):07d}"
+            rnc = base + str(cedula_check_digit(base))
+            name = person_name(rng)
+            trade_name = ''
+        else:
+            base = f"{rng.choice('1345')}{rng.randrange(10 ** 7):07d}"
+            rnc = base + str(rnc_check_digit(base))
+            name = company_name(rng)
+            trade_name = name.rsplit(' ', 1)[0] if rng.random() < 0.3 else ''
+        if rnc in seen:
+            continue
+        seen.add(rnc)
+        fecha = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1975, 2024)}"
+        yield [rnc, name, trade_name, rng.choice(ACTIVITIES), '', '', '', '.', fecha,
+               rng.choice(ESTADOS), rng.choice(REGIMENES)]
+
+
+def write_dataset(path: str, rows: int, seed: int = 42) -> str:
+    """Write a synthetic DGII file and return its path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='cp1252', newline='') as handle:
+        for record in generate_rows(rows, seed):
+            handle.write('|'.join(record) + '\r\n')
+    return path
+
+
+def read_identifiers(path: str) -> List[str]:
+    """RNCs of a generated file, in file order"""
+    with open(path, 'r', encoding='cp1252', newline='') as handle:
+        return [line.split('|', 1)[0] for line in handle if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic DGII RNC file.')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--rows', type=int, help='Number of records.')
+    size.add_argument('--size', choices=sorted(SIZES), default='small',
+                      help='Preset size: small=10k, medium=100k, large=1M rows.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Output file (default: benchmarks/data/dgii_<rows>.txt).')
+    args = parser.parse_args(argv)
+
+    rows = args.rows or SIZES[args.size]
+    output = args.output or os.path.join(os.path.dirname(__file__), 'data', f'dgii_{rows}.txt')
+    write_dataset(output, rows, args.seed)
+    print(f"Wrote {rows:,} records to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,5 +14,6 @@ pip3 install oauthlib==3.3.1
 pip3 install PyJWT==2.10.1
 pip3 install SQLAlchemy==2.0.41
 pip3 install Flask-Dance==7.1.0
+pip3 install openpyxl==3.1.5
 
 echo "Python dependencies installed successfully!"
\ No newline at end of file
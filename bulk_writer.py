@@ -0,0 +1,115 @@
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from models import db
+
+STAGING_TABLE = 'rnc_staging'
+
+
+class BulkRecordWriter:
+    """Upserts batches of RNC records through a temporary staging table.
+
+    On PostgreSQL each batch is streamed into the staging table with
+    ``COPY FROM STDIN`` through psycopg2; other databases (SQLite in
+    development and tests) fall back to an ``executemany`` insert. A single
+    ``INSERT ... ON CONFLICT (rnc)`` then moves the batch into rnc_records,
+    updating existing rows only when one of their values actually changed.
+    """
+
+    def __init__(self, columns: List[str], update_existing: bool = True,
+                 column_types: Optional[Dict[str, str]] = None):
+        if columns[0] != 'rnc':
+            raise ValueError("The first staging column must be 'rnc'")
+        self.columns = columns
+        self.value_columns = columns[1:]
+        self.update_existing = update_existing
+        self.column_types = column_types or {}
+
+    @staticmethod
+    def supports(dialect_name: str) -> bool:
+        """Whether the database supports the staging upsert"""
+        return dialect_name in ('postgresql', 'sqlite')
+
+    def _changed_predicate(self, dialect_name: str, target: str, source: str) -> str:
+        """SQL condition that is true when any value column differs"""
+        operator = 'IS DISTINCT FROM' if dialect_name == 'postgresql' else 'IS NOT'
+        return '(' + ' OR '.join(
+            f"{target}.{column} {operator} {source}.{column}" for column in self.value_columns
+        ) + ')'
+
+    def _prepare_staging(self, connection):
+        """Create (once per connection) and empty the staging table"""
+        column_defs = ', '.join(
+            ['rnc VARCHAR(11)'] +
+            [f"{column} {self.column_types.get(column, 'TEXT')}" for column in self.value_columns]
+        )
+        connection.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ({column_defs})"))
+        connection.execute(text(f"DELETE FROM {STAGING_TABLE}"))
+
+    def _load_staging(self, connection, frame):
+        """Load a batch into the staging table"""
+        column_list = ', '.join(self.columns)
+        text_columns = ', '.join(column for column in self.columns if column not in self.column_types)
+        if connection.dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            frame.to_csv(buffer, columns=self.columns, index=False, header=False)
+            buffer.seek(0)
+            cursor = connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY {STAGING_TABLE} ({column_list}) FROM STDIN "
+                    f"WITH (FORMAT csv, FORCE_NOT_NULL ({text_columns}))",
+                    buffer
+                )
+            finally:
+                cursor.close()
+        else:
+            placeholders = ', '.join(f':{column}' for column in self.columns)
+            connection.execute(
+                text(f"INSERT INTO {STAGING_TABLE} ({column_list}) VALUES ({placeholders})"),
+                frame[self.columns].to_dict('records')
+            )
+
+    def write(self, frame) -> Tuple[int, int]:
+        """Upsert a batch of records; returns (new, updated) counts.
+
+        RNCs must be unique within the batch. The caller owns the
+        transaction and is expected to commit or roll back.
+        """
+        if frame.empty:
+            return 0, 0
+
+        connection = db.session.connection()
+        dialect_name = connection.dialect.name
+        self._prepare_staging(connection)
+        self._load_staging(connection, frame)
+
+        new_count = connection.execute(text(
+            f"SELECT COUNT(*) FROM {STAGING_TABLE} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM rnc_records r WHERE r.rnc = s.rnc)"
+        )).scalar()
+
+        column_list = ', '.join(self.columns)
+        if self.update_existing:
+            updated_count = connection.execute(text(
+                f"SELECT COUNT(*) FROM {STAGING_TABLE} s JOIN rnc_records r ON r.rnc = s.rnc "
+                f"WHERE {self._changed_predicate(dialect_name, 'r', 's')}"
+            )).scalar()
+            assignments = ', '.join(f"{column} = excluded.{column}" for column in self.value_columns)
+            conflict_action = (
+                f"DO UPDATE SET {assignments} "
+                f"WHERE {self._changed_predicate(dialect_name, 'rnc_records', 'excluded')}"
+            )
+        else:
+            updated_count = 0
+            conflict_action = "DO NOTHING"
+
+        # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join constraint
+        connection.execute(text(
+            f"INSERT INTO rnc_records ({column_list}) "
+            f"SELECT {column_list} FROM {STAGING_TABLE} WHERE true "
+            f"ON CONFLICT (rnc) {conflict_action}"
+        ))
+        logging.debug(f"Staging upsert: {new_count} new, {updated_count} updated of {len(frame)}")
+        return new_count, updated_count
@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Dict, Iterable
+
+# DGII modulus-11 weights of the first 8 digits of an RNC
+RNC_WEIGHTS = (7, 9, 8, 6, 5, 4, 3, 2)
+
+# Luhn weights of the first 10 digits of a cédula
+CEDULA_WEIGHTS = (1, 2, 1, 2, 1, 2, 1, 2, 1, 2)
+
+IDENTIFIER_LENGTHS = (9, 11)
+
+
+def rnc_check_digit(base: str) -> int:
+    """DGII modulus-11 check digit of the first 8 digits of an RNC"""
+    remainder = sum(int(d) * w for d, w in zip(base, RNC_WEIGHTS)) % 11
+    if remainder == 0:
+        return 2
+    if remainder == 1:
+        return 1
+    return 11 - remainder
+
+
+def cedula_check_digit(base: str) -> int:
+    """Luhn check digit of the first 10 digits of a cédula"""
+    total = 0
+    for position, digit in enumerate(base):
+        product = int(digit) * (2 if position % 2 else 1)
+        total += product // 10 + product % 10
+    return (10 - total % 10) % 10
+
+
+def format_valid(identifier: str) -> bool:
+    """Whether a cleaned identifier has the 9 digits of an RNC or the 11 of a cédula"""
+    return len(identifier) in IDENTIFIER_LENGTHS and identifier.isascii() and identifier.isdigit()
+
+
+def checksum_valid(identifier: str) -> bool:
+    """Whether the last digit of a well-formed RNC or cédula matches its check digit"""
+    if not format_valid(identifier):
+        return False
+    if len(identifier) == 9:
+        return rnc_check_digit(identifier[:8]) == int(identifier[8])
+    return cedula_check_digit(identifier[:10]) == int(identifier[10])
+
+
+def check_identifier(identifier: str) -> Dict[str, bool]:
+    """Zero-I/O checks of a cleaned identifier: format and check digit"""
+    well_formed = format_valid(identifier)
+    return {
+        "format_valid": well_formed,
+        "checksum_valid": well_formed and checksum_valid(identifier)
+    }
+
+
+def _digits_valid(digits: np.ndarray) -> np.ndarray:
+    """Check digit test of each row of an (n, 9) or (n, 11) matrix of digits"""
+    digits = digits.astype(np.int64)
+    if digits.shape[1] == 9:
+        remainder = digits[:, :8] @ np.array(RNC_WEIGHTS) % 11
+        expected = np.where(remainder == 0, 2, np.where(remainder == 1, 1, 11 - remainder))
+        return expected == digits[:, 8]
+    products = digits[:, :10] * np.array(CEDULA_WEIGHTS)
+    total = (products // 10 + products % 10).sum(axis=1)
+    return (10 - total % 10) % 10 == digits[:, 10]
+
+
+def checksum_valid_many(identifiers: Iterable[str]) -> np.ndarray:
+    """Vectorized checksum_valid over cleaned identifiers (a list, array or pandas Series).
+
+    Each length group is viewed as a matrix of code points, so the whole
+    batch is checked with a handful of numpy operations. Anything that is
+    not 9 or 11 ASCII digits is reported as invalid.
+    """
+    values = np.asarray(identifiers, dtype=str)
+    valid = np.zeros(len(values), dtype=bool)
+    if not len(values):
+        return valid
+    lengths = np.char.str_len(values)
+    for length in IDENTIFIER_LENGTHS:
+        selected = np.flatnonzero(lengths == length)
+        if not len(selected):
+            continue
+        # '<U' strings are UCS-4, one uint32 code point per character
+        digits = values[selected].astype(f'U{length}').view(np.uint32).reshape(-1, length) - ord('0')
+        all_digits = (digits <= 9).all(axis=1)
+        valid[selected] = all_digits & _digits_valid(np.where(digits <= 9, digits, 0))
+    return valid
+
+
+def checksum_valid_keys(keys: np.ndarray) -> np.ndarray:
+    """Vectorized checksum_valid over RNCIndex keys (see rnc_index.encode_rnc)"""
+    keys = np.asarray(keys, dtype=np.uint64)
+    valid = np.zeros(len(keys), dtype=bool)
+    for length in IDENTIFIER_LENGTHS:
+        # encode_rnc prepends a '1', so an n-digit identifier becomes 10**n + identifier
+        lower = np.uint64(10 ** length)
+        selected = np.flatnonzero((keys >= lower) & (keys < 2 * lower))
+        if not len(selected):
+            continue
+        powers = np.uint64(10) ** np.arange(length - 1, -1, -1, dtype=np.uint64)
+        digits = (keys[selected, None] - lower) // powers % np.uint64(10)
+        valid[selected] = _digits_valid(digits)
+    return valid
@@ -0,0 +1,90 @@
+import os
+import logging
+import click
+from flask import Flask
+
+DEFAULT_DATA_FILE = os.path.join('attached_assets', 'DGII_RNC_1753101730023.TXT')
+
+
+def init_db():
+    """Create missing tables and add columns introduced since they were created"""
+    from models import db, upgrade_schema
+    db.create_all()
+    upgrade_schema()
+
+
+def load_data(file_path: str, if_empty: bool = False, remove_missing: bool = False) -> bool:
+    """Import a DGII file and write the snapshot; with if_empty, only when the table has no rows"""
+    from models import db, RNCRecord, DatasetInfo
+    from rnc_service import rnc_service
+    from rnc_snapshot import read_snapshot_version, write_snapshot_from_database
+    from data_importer import DataImporter
+
+    if if_empty and db.session.query(RNCRecord.id).limit(1).scalar() is not None:
+        logging.info("RNC data already loaded; skipping import")
+        # The snapshot is tagged with the dataset row's version, so make sure the row exists first
+        if db.session.get(DatasetInfo, 1) is None:
+            rnc_service.refresh_dataset_info(data_changed=True)
+        # Also rewrites a snapshot that is missing, in an older format or behind the database
+        if read_snapshot_version() != rnc_service.get_data_version():
+            write_snapshot_from_database()
+        return True
+
+    result = DataImporter().import_from_file(file_path, update_existing=not if_empty,
+                                             remove_missing=remove_missing)
+    result.pop('profile', None)  # Already logged as a one-line stage summary
+    if result.get('total_processed', 0) == 0:
+        logging.error(f"Import failed: {result}")
+        return False
+    logging.info(f"Import completed: {result}")
+    return True
+
+
+def register_commands(app: Flask):
+    """Register the one-shot setup commands on the app's CLI"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create or upgrade the database schema."""
+        init_db()
+        click.echo('Database schema is up to date.')
+
+    @app.cli.command('load-data')
+    @click.option('--file', 'file_path', default=DEFAULT_DATA_FILE, show_default=True,
+                  help='Pipe-delimited DGII RNC file to import.')
+    @click.option('--if-empty', is_flag=True, help='Only import when rnc_records has no rows.')
+    @click.option('--remove-missing', is_flag=True, help='Delete RNCs that are not in the file.')
+    def load_data_command(file_path, if_empty, remove_missing):
+        """Import DGII data and rebuild the lookup snapshot."""
+        if not load_data(file_path, if_empty=if_empty, remove_missing=remove_missing):
+            raise click.ClickException(f'Could not import {file_path}')
+        click.echo('RNC data loaded.')
+
+    @app.cli.command('create-admin')
+    def create_admin_command():
+        """Create the default admin user if there is none."""
+        from admin_routes import init_admin_user
+        init_admin_user()
+        click.echo('Admin user ready.')
+
+    @app.cli.command('bootstrap')
+    @click.option('--file', 'file_path', default=DEFAULT_DATA_FILE, show_default=True,
+                  help='DGII file to import when the database is empty.')
+    def bootstrap_command(file_path):
+        """Run init-db, load-data --if-empty and create-admin (safe to repeat on every deploy)."""
+        from admin_routes import init_admin_user
+        init_db()
+        if not load_data(file_path, if_empty=True):
+            raise click.ClickException(f'Could not import {file_path}')
+        init_admin_user()
+        click.echo('Bootstrap complete.')
+
+    @app.cli.command('profile-token')
+    @click.option('--ttl', default=3600, show_default=True, help='Seconds the token stays valid.')
+    def profile_token_command(ttl):
+        """Print a signed X-Profile-Token header value for profiling requests."""
+        from request_profiler import make_profile_token, profile_token_secret
+        secret_key = profile_token_secret()
+        if not secret_key:
+            raise click.ClickException('Set PROFILE_TOKEN_SECRET or SESSION_SECRET to enable profiling tokens')
+        click.echo(make_profile_token(secret_key, ttl))
@@ -1,25 +1,122 @@
 import pandas as pd
+import numpy as np
+import csv
+import codecs
 import os
+import re
+import time
 import logging
+from array import array
 from models import db, RNCRecord, DataUpdateLog
+from bulk_writer import BulkRecordWriter
+from import_profile import ImportProfile, TimedReader
+from rnc_index import encode_rnc
+from check_digit import checksum_valid_many
 from datetime import datetime
+from typing import Optional
+
+# Column layout of the DGII pipe-delimited RNC file
+IMPORT_COLUMNS = [
+    'rnc', 'nombre', 'campo_3', 'actividad_economica', 'campo_5', 'campo_6',
+    'campo_7', 'campo_8', 'fecha_registro', 'estado', 'regimen'
+]
+
+# Placeholder values in the source file that mean "no data"
+EMPTY_VALUES = ['nan', 'None', '.', 'NaN']
+
+# cp1252 bytes in the 0x80-0x9F range: printable characters vs. undefined
+CP1252_UNDEFINED = frozenset(b'\x81\x8d\x8f\x90\x9d')
+CP1252_PRINTABLE_C1 = frozenset(range(0x80, 0xA0)) - CP1252_UNDEFINED
+
+# UTF-8 text that was decoded as latin-1/cp1252 at some point, e.g. "PEÃ\x91A"
+MOJIBAKE_PATTERN = re.compile('[\u00c2\u00c3][\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u2013-\u2122]')
+MOJIBAKE_THRESHOLD = 3
+
+# Bytes read per block by the whole-file UTF-8 check
+UTF8_SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Identifiers with a wrong check digit listed in the import log
+CHECKSUM_SAMPLE_SIZE = 20
+
+class HashManifest:
+    """Content hashes of the records already in the database, keyed by RNC.
+
+    Keys and hashes live in two sorted numpy arrays, so a whole chunk is
+    diffed against the existing table with a single ``searchsorted`` call
+    and no per-row database access.
+    """
+    
+    def __init__(self, keys, hashes):
+        self.keys = keys
+        self.hashes = hashes
+        self.seen = np.zeros(len(keys), dtype=bool)
+    
+    @classmethod
+    def from_database(cls) -> 'HashManifest':
+        """Load (rnc, content_hash) for every existing record"""
+        keys = array('Q')
+        hashes = array('q')
+        rows = db.session.execute(
+            db.select(RNCRecord.rnc, RNCRecord.content_hash).execution_options(yield_per=50000)
+        )
+        for rnc, content_hash in rows:
+            if rnc and rnc.isdigit():
+                keys.append(encode_rnc(rnc))
+                hashes.append(content_hash or 0)  # Rows imported before hashing always differ
+        
+        keys = np.frombuffer(keys, dtype=np.uint64)
+        hashes = np.frombuffer(hashes, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], hashes[order])
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def diff(self, keys, hashes):
+        """Classify a chunk; returns (found, unchanged) masks and marks found records as seen"""
+        if not len(self.keys):
+            empty = np.zeros(len(keys), dtype=bool)
+            return empty, empty
+        
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        unchanged = found & (self.hashes[positions] == hashes)
+        self.seen[positions[found]] = True
+        return found, unchanged
+    
+    def missing_rncs(self):
+        """RNCs in the database that did not appear in the imported file"""
+        return [str(key)[1:] for key in self.keys[~self.seen].tolist()]
 
 class DataImporter:
     """Enhanced data importer with update/insert capabilities and progress tracking"""
     
-    def __init__(self):
+    def __init__(self, progress_callback=None):
         self.batch_size = 5000  # Smaller batch size to prevent timeouts
-        self.supported_encodings = ['latin-1', 'windows-1252', 'iso-8859-1', 'utf-8']
+        self.progress_callback = progress_callback  # Called as (stats, percentage) after each chunk
+        self.chunk_size = 50000  # Rows parsed per chunk; bounds peak memory
+        self.encoding_sample_size = 256 * 1024  # Bytes sniffed to detect the file encoding
+        self.profile = ImportProfile()  # Stage timings of the current import
     
-    def import_from_file(self, file_path: str, update_existing: bool = True) -> dict:
-        """Import data from file with optional updates"""
+    def import_from_file(self, file_path: str, update_existing: bool = True,
+                         remove_missing: bool = False) -> dict:
+        """Import data from file with optional updates and removal of RNCs no longer listed"""
         stats = {
             'total_processed': 0,
             'total_imported': 0,
             'new': 0,
             'updated': 0,
-            'errors': 0
+            'unchanged': 0,
+            'missing': 0,
+            'removed': 0,
+            'errors': 0,
+            'failed_batches': 0,
+            'checksum_invalid': 0,
+            'checksum_invalid_sample': [],
+            'encoding': None,
+            'encoding_warning': None
         }
+        self.profile = ImportProfile()
         
         try:
             if not os.path.exists(file_path):
@@ -27,136 +124,320 @@ class DataImporter:
             
             logging.info(f"Starting data import from: {file_path}")
             
-            # Load data with encoding detection
-            df = self._load_file_with_encoding(file_path)
-            if df is None:
-                raise Exception("Failed to load file with any supported encoding")
+            # Sniff the encoding from a sample, checked against the whole file when it looks like UTF-8
+            with self.profile.stage('encoding'):
+                encoding, warning = self._detect_encoding(file_path)
+            stats['encoding'] = encoding
+            stats['encoding_warning'] = warning
+            logging.info(f"🔤 Detected encoding: {encoding}")
+            if warning:
+                logging.warning(f"⚠️ {warning}")
             
-            stats['total_processed'] = len(df)
-            logging.info(f"Processing {len(df)} records")
+            # Decode and parse the file in a single streaming pass
+            with open(file_path, 'r', encoding=encoding, newline='') as handle:
+                handle = TimedReader(handle, self.profile)
+                chunks = self._read_chunks(handle)
+                stats = self._process_chunks(chunks, handle, os.path.getsize(file_path),
+                                             update_existing, remove_missing, stats)
             
-            # Process in batches
-            return self._process_dataframe(df, update_existing, stats)
+            # Rebuild in-memory lookup structures from the new data
+            if self.nothing_written(stats):
+                logging.error("❌ No records could be written; keeping the current data and snapshot")
+            else:
+                with self.profile.stage('refresh'):
+                    self._refresh_lookup_structures(stats)
+            stats['profile'] = self.profile.to_dict()
+            logging.info(f"⏱️ Stage timings: {self.profile.summary()}")
+            return stats
             
         except Exception as e:
             logging.error(f"Import error: {str(e)}")
             stats['errors'] += 1
+            stats['profile'] = self.profile.to_dict()
             return stats
     
-    def _load_file_with_encoding(self, file_path: str):
-        """Try loading file with different encodings"""
-        for encoding in self.supported_encodings:
-            try:
-                logging.info(f"Trying encoding: {encoding}")
-                df = pd.read_csv(
-                    file_path,
-                    sep='|',
-                    encoding=encoding,
-                    dtype=str,
-                    na_filter=False,
-                    low_memory=False
-                )
-                logging.info(f"Successfully loaded with {encoding}")
-                return df
-            except Exception as e:
-                logging.warning(f"Failed with {encoding}: {str(e)}")
-                continue
-        return None
+    @staticmethod
+    def nothing_written(stats: dict) -> bool:
+        """Whether an import had rows to write but every write failed"""
+        if stats['new'] or stats['updated'] or stats['removed']:
+            return False
+        return stats['failed_batches'] > 0 or 0 < stats['total_processed'] <= stats['errors']
+    
+    def _detect_encoding(self, file_path: str):
+        """Detect the file encoding from a prefix sample; returns (encoding, warning)"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(self.encoding_sample_size)
+        
+        warning = None
+        if sample.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = 'utf-16'
+        elif self._is_valid_utf8(sample):
+            # An ASCII or UTF-8 prefix says nothing about the rest of the file,
+            # so confirm with a strict UTF-8 decode of all of it
+            bad_block = self._first_non_utf8_block(file_path)
+            if bad_block is None:
+                encoding = 'utf-8'
+            else:
+                encoding = self._single_byte_encoding(bad_block)
+                if not sample.isascii():
+                    warning = (f"Mixed encodings in source file: UTF-8 in the first {len(sample):,} bytes "
+                               f"but not after them; decoding it all as {encoding}")
+        else:
+            encoding = self._single_byte_encoding(sample)
+        
+        text = sample.decode(encoding, errors='replace')
+        mojibake_count = len(MOJIBAKE_PATTERN.findall(text))
+        if mojibake_count >= MOJIBAKE_THRESHOLD and warning is None:
+            warning = (f"Possible mis-encoded names (mojibake) in source file: "
+                       f"{mojibake_count} suspicious sequences in the first {len(sample):,} bytes")
+        return encoding, warning
+    
+    @staticmethod
+    def _single_byte_encoding(data: bytes) -> str:
+        """cp1252 or latin-1 for bytes that are not UTF-8"""
+        if any(byte in CP1252_PRINTABLE_C1 for byte in data) and \
+                not any(byte in CP1252_UNDEFINED for byte in data):
+            # Bytes 0x80-0x9F are only printable in cp1252 (€, curly quotes, ...)
+            return 'cp1252'
+        return 'latin-1'
+    
+    @staticmethod
+    def _is_valid_utf8(sample: bytes) -> bool:
+        """Check that a sample is UTF-8, tolerating a sequence cut off at the end"""
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return True
+        except UnicodeDecodeError:
+            return False
+    
+    def _first_non_utf8_block(self, file_path: str) -> Optional[bytes]:
+        """Bytes around the first invalid UTF-8 sequence of the file, or None if it all decodes"""
+        start_time = time.perf_counter()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        buffer = bytearray(UTF8_SCAN_BLOCK_SIZE)
+        scanned = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                size = f.readinto(buffer)
+                block = memoryview(buffer)[:size]
+                try:
+                    decoder.decode(block, final=not size)
+                except UnicodeDecodeError as e:
+                    # Enough context for the cp1252/latin-1 heuristic without scanning the whole block
+                    around = bytes(block[max(e.start - self.encoding_sample_size, 0):e.start + self.encoding_sample_size])
+                    logging.info(f"🔤 Not UTF-8 at byte {scanned + e.start:,} "
+                                 f"(checked in {time.perf_counter() - start_time:.2f}s)")
+                    return around
+                scanned += size
+                if not size:
+                    logging.info(f"🔤 UTF-8 check of {scanned:,} bytes in {time.perf_counter() - start_time:.2f}s")
+                    return None
+    
+    def _read_chunks(self, handle):
+        """Chunked reader over an already decoded text handle"""
+        return pd.read_csv(
+            handle,
+            sep='|',
+            header=None,
+            names=IMPORT_COLUMNS,
+            usecols=range(len(IMPORT_COLUMNS)),
+            dtype=str,
+            na_filter=False,
+            quoting=csv.QUOTE_NONE,
+            chunksize=self.chunk_size
+        )
     
-    def _process_dataframe(self, df, update_existing, stats):
-        """Process dataframe in batches with progress tracking and smart duplicate handling"""
-        df.columns = [col.strip() for col in df.columns]
-        rnc_column = df.columns[0]
+    def _prepare_chunk(self, chunk, stats):
+        """Vectorized cleanup of a parsed chunk, flagging bad check digits in stats; returns (valid records, invalid count)"""
+        with self.profile.stage('clean', len(chunk)):
+            chunk = chunk.fillna('')
+            for column in IMPORT_COLUMNS:
+                chunk[column] = chunk[column].str.strip()
+            chunk['rnc'] = chunk['rnc'].str.replace(' ', '', regex=False)
+            
+            # Clean empty/invalid values
+            chunk = chunk.mask(chunk.isin(EMPTY_VALUES), '')
         
-        total_rows = len(df)
+        with self.profile.stage('validate', len(chunk)):
+            valid = chunk['rnc'].str.fullmatch(r'[0-9]{9}|[0-9]{11}')
+            invalid_count = int((~valid).sum())
+            chunk = chunk[valid]
+            
+            # DGII itself publishes some identifiers with wrong check digits, so these
+            # rows are still imported (the lookup pre-filter exempts them); they are
+            # only flagged, as a sign of a corrupted source file when there are many
+            bad_checksum = chunk['rnc'][~checksum_valid_many(chunk['rnc'])]
+            stats['checksum_invalid'] += len(bad_checksum)
+            sample = stats['checksum_invalid_sample']
+            sample.extend(bad_checksum.iloc[:CHECKSUM_SAMPLE_SIZE - len(sample)].tolist())
+        return chunk, invalid_count
+    
+    def _content_hashes(self, chunk):
+        """Vectorized 64-bit hash of each row's imported values"""
+        hashed = pd.util.hash_pandas_object(chunk[IMPORT_COLUMNS[1:]], index=False)
+        return hashed.to_numpy().view(np.int64)
+    
+    def _process_chunks(self, chunks, handle, file_size, update_existing, remove_missing, stats):
+        """Process parsed chunks in batches with progress tracking and content-hash diffing"""
         processed_rows = 0
-        records_to_insert = []
+        failed_chunks = 0
+        writer = BulkRecordWriter(IMPORT_COLUMNS + ['content_hash'], update_existing=update_existing,
+                                  column_types={'content_hash': 'BIGINT'})
+        use_staging = BulkRecordWriter.supports(db.engine.dialect.name)
         
-        # For reimports, skip the existing RNC loading to avoid timeout
-        existing_rncs = set()
-        if not update_existing:
-            logging.info("🔍 Loading existing RNCs for duplicate checking...")
-            try:
-                from sqlalchemy import text
-                existing_results = db.session.execute(text("SELECT rnc FROM rnc_records")).fetchall()
-                existing_rncs = {row[0] for row in existing_results}
-                logging.info(f"📋 Found {len(existing_rncs):,} existing RNCs")
-            except Exception as e:
-                logging.warning(f"⚠️ Could not load existing RNCs: {e}")
+        if update_existing:
+            logging.info("🔄 Update mode: changed records will be updated in place")
         else:
-            logging.info("🔄 Reimport mode: will check duplicates during processing")
+            logging.info("➕ Insert-only mode: existing RNCs will be left untouched")
+        if not use_staging:
+            logging.warning(f"⚠️ No staging upsert for {db.engine.dialect.name}, using row inserts")
         
-        # Progress tracking
-        progress_interval = max(500, total_rows // 200)  # More frequent updates
+        logging.info("🔍 Loading content hashes of existing records...")
+        with self.profile.stage('manifest'):
+            manifest = HashManifest.from_database()
+        logging.info(f"📋 Found {len(manifest):,} existing RNCs")
         
-        logging.info(f"📊 Starting import of {total_rows:,} records...")
+        logging.info(f"📊 Starting streaming import ({file_size:,} bytes, {self.chunk_size:,} rows per chunk)...")
         logging.info("🚀 Progress: [          ] 0%")
         
-        for index, row in df.iterrows():
+        while True:
+            # Parse time excludes the reads (decoding) pandas makes while building the chunk
+            decode_before = self.profile.seconds('decode')
+            parse_start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            decode_time = self.profile.seconds('decode') - decode_before
+            self.profile.add('parse', time.perf_counter() - parse_start - decode_time, len(chunk))
+            self.profile.add('decode', 0, len(chunk))
+            
             try:
-                # Extract and validate RNC
-                rnc = str(row[rnc_column]).strip().replace(' ', '')
-                if not rnc.isdigit() or len(rnc) not in [9, 11]:
-                    stats['errors'] += 1
-                    processed_rows += 1
-                    continue
+                processed_rows += len(chunk)
+                stats['total_processed'] += len(chunk)
                 
-                # Skip if already exists (only for initial imports)
-                if not update_existing and rnc in existing_rncs:
-                    processed_rows += 1
-                    continue
+                chunk, invalid_count = self._prepare_chunk(chunk, stats)
+                stats['errors'] += invalid_count
                 
-                # Prepare record data
-                record_data = self._prepare_record_data(row, df.columns, rnc)
-                records_to_insert.append(record_data)
-                
-                if not update_existing:
-                    existing_rncs.add(rnc)  # Add to set to avoid processing again
+                with self.profile.stage('diff', len(chunk)):
+                    # The last occurrence of a repeated RNC wins
+                    chunk = chunk.drop_duplicates('rnc', keep='last')
+                    chunk = chunk.assign(content_hash=self._content_hashes(chunk))
+                    
+                    # Only new and changed rows are written
+                    keys = ('1' + chunk['rnc']).astype('uint64').to_numpy()
+                    found, unchanged = manifest.diff(keys, chunk['content_hash'].to_numpy())
+                    skip = unchanged if update_existing else found
+                    stats['unchanged'] += int(skip.sum())
+                    chunk = chunk[~skip]
                 
-                stats['new'] += 1
-                processed_rows += 1
+                for start in range(0, len(chunk), self.batch_size):
+                    batch = chunk.iloc[start:start + self.batch_size]
+                    batch_start = time.perf_counter()
+                    if use_staging:
+                        self._write_batch(writer, batch, stats)
+                    else:
+                        new_count, updated_count = self._process_batch_smart(
+                            batch.to_dict('records'), stats, update_existing)
+                        stats['new'] += new_count
+                        stats['updated'] += updated_count
+                    self.profile.record_batch(time.perf_counter() - batch_start, len(batch))
                 
-                # Process smaller batches for better responsiveness
-                if len(records_to_insert) >= min(self.batch_size, 5000):
-                    self._process_batch_smart(records_to_insert, stats)
-                    records_to_insert = []
+                self._report_progress(handle.buffer.tell(), file_size, processed_rows, stats)
                 
-                # Show progress more frequently
-                if processed_rows % progress_interval == 0 or processed_rows == total_rows:
-                    self._show_progress(processed_rows, total_rows)
-                    
-                # Yield control occasionally to prevent timeout
-                if processed_rows % 1000 == 0:
-                    db.session.flush()
-                    
             except Exception as e:
-                stats['errors'] += 1
-                processed_rows += 1
-                logging.warning(f"❌ Error processing row {index}: {str(e)}")
+                failed_chunks += 1
+                stats['failed_batches'] += 1
+                stats['errors'] += len(chunk)
+                logging.warning(f"❌ Error processing chunk ending at row {processed_rows}: {str(e)}")
         
-        # Process remaining records
-        if records_to_insert:
-            self._process_batch_smart(records_to_insert, stats)
+        missing_rncs = manifest.missing_rncs()
+        stats['missing'] = len(missing_rncs)
+        if missing_rncs:
+            logging.info(f"🗂️ {len(missing_rncs):,} existing RNCs are no longer in the file")
+            if remove_missing and failed_chunks == 0 and processed_rows > 0:
+                with self.profile.stage('remove', len(missing_rncs)):
+                    self._remove_records(missing_rncs, stats)
         
         logging.info("🎉 Import process completed!")
         logging.info(f"📊 Final Statistics:")
         logging.info(f"  ✅ Total processed: {processed_rows:,}")
-        logging.info(f"  ✅ New records imported: {stats['total_imported']:,}")
+        logging.info(f"  ✅ New records imported: {stats['new']:,}")
+        logging.info(f"  ✅ Existing records updated: {stats['updated']:,}")
+        logging.info(f"  ⏭️ Unchanged records skipped: {stats['unchanged']:,}")
+        logging.info(f"  🗑️ Records removed: {stats['removed']:,}")
         logging.info(f"  ⚠️ Errors/skipped: {stats['errors']:,}")
+        if stats['checksum_invalid']:
+            logging.warning(f"  🔢 Invalid check digits: {stats['checksum_invalid']:,} "
+                            f"(e.g. {', '.join(stats['checksum_invalid_sample'][:5])})")
         logging.info("🏁 Status: COMPLETED")
         return stats
     
-    def _show_progress(self, current, total):
-        """Display progress bar in logs"""
-        percentage = (current / total) * 100
+    def _remove_records(self, rncs, stats):
+        """Delete records whose RNC disappeared from the source file"""
+        table = RNCRecord.__table__
+        for start in range(0, len(rncs), self.batch_size):
+            batch = rncs[start:start + self.batch_size]
+            try:
+                result = db.session.execute(table.delete().where(table.c.rnc.in_(batch)))
+                db.session.commit()
+                stats['removed'] += result.rowcount
+            except Exception as e:
+                db.session.rollback()
+                stats['errors'] += len(batch)
+                logging.warning(f"❌ Failed to remove batch of {len(batch):,} records: {str(e)}")
+        logging.info(f"🗑️ Removed {stats['removed']:,} records no longer published by DGII")
+    
+    def _write_batch(self, writer, batch, stats):
+        """Upsert one batch through the staging table writer"""
+        try:
+            new_count, updated_count = writer.write(batch)
+            db.session.commit()
+            stats['new'] += new_count
+            stats['updated'] += updated_count
+            stats['total_imported'] += new_count + updated_count
+            logging.info(f"💾 Batch of {len(batch):,}: {new_count:,} new, {updated_count:,} updated")
+        except Exception as e:
+            db.session.rollback()
+            stats['errors'] += len(batch)
+            stats['failed_batches'] += 1
+            logging.warning(f"❌ Staging upsert failed for batch of {len(batch):,} records: {str(e)}")
+    
+    def _refresh_lookup_structures(self, stats: dict):
+        """Rebuild dataset metadata and the service's in-memory structures after an import"""
+        from rnc_service import rnc_service
+        from rnc_snapshot import write_snapshot_from_database
+        data_changed = bool(stats['new'] or stats['updated'] or stats['removed'])
+        try:
+            rnc_service.refresh_dataset_info(data_changed=data_changed)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"❌ Could not update dataset info: {str(e)}")
+        try:
+            write_snapshot_from_database()
+        except Exception as e:
+            logging.error(f"❌ Could not write snapshot: {str(e)}")
+        if rnc_service.reload():
+            logging.info(f"🔁 Lookup structures rebuilt: {len(rnc_service.index):,} records")
+    
+    def _report_progress(self, current, total, rows, stats):
+        """Display progress bar in logs and notify the progress callback"""
+        percentage = min((current / total) * 100, 100.0) if total else 100.0
         filled = int(percentage // 10)
         bar = "█" * filled + "░" * (10 - filled)
-        logging.info(f"🚀 Progress: [{bar}] {percentage:.1f}% ({current:,}/{total:,})")
+        logging.info(f"🚀 Progress: [{bar}] {percentage:.1f}% ({rows:,} rows)")
+        
+        if self.progress_callback:
+            try:
+                self.progress_callback(dict(stats), percentage)
+            except Exception as e:
+                logging.warning(f"⚠️ Progress callback failed: {str(e)}")
     
-    def _process_batch_smart(self, records, stats):
-        """Smart batch processing with duplicate handling"""
+    def _process_batch_smart(self, records, stats, update_existing=False):
+        """Smart batch processing with duplicate handling; returns (inserted, updated) counts"""
         if not records:
-            return
+            return 0, 0
             
         try:
             # Use bulk insert for better performance
@@ -164,13 +445,15 @@ class DataImporter:
             db.session.commit()
             stats['total_imported'] += len(records)
             logging.info(f"💾 Imported batch of {len(records):,} records")
+            return len(records), 0
             
         except Exception as e:
             logging.warning(f"⚠️ Bulk insert failed, processing individually...")
             db.session.rollback()
             
             # Process individually with ON CONFLICT handling
-            successful = 0
+            inserted = 0
+            updated = 0
             for record in records:
                 try:
                     # Check if exists first using ORM
@@ -180,7 +463,13 @@ class DataImporter:
                         new_record = RNCRecord(**record)
                         db.session.add(new_record)
                         db.session.commit()
-                        successful += 1
+                        inserted += 1
+                    elif update_existing:
+                        for key, value in record.items():
+                            if key != 'rnc':  # Don't update the unique key
+                                setattr(existing, key, value)
+                        db.session.commit()
+                        updated += 1
                     # Don't count duplicates as errors
                         
                 except Exception as individual_error:
@@ -188,32 +477,10 @@ class DataImporter:
                     stats['errors'] += 1
                     logging.debug(f"❌ Failed to insert RNC {record.get('rnc', 'unknown')}: {str(individual_error)}")
             
-            stats['total_imported'] += successful
-            if successful > 0:
-                logging.info(f"💾 Imported {successful:,} records individually")
-    
-    def _prepare_record_data(self, row, columns, rnc):
-        """Prepare record data from row"""
-        record_data = {
-            'rnc': rnc,
-            'nombre': str(row[columns[1]]).strip() if len(columns) > 1 else '',
-            'campo_3': str(row[columns[2]]).strip() if len(columns) > 2 else '',
-            'actividad_economica': str(row[columns[3]]).strip() if len(columns) > 3 else '',
-            'campo_5': str(row[columns[4]]).strip() if len(columns) > 4 else '',
-            'campo_6': str(row[columns[5]]).strip() if len(columns) > 5 else '',
-            'campo_7': str(row[columns[6]]).strip() if len(columns) > 6 else '',
-            'campo_8': str(row[columns[7]]).strip() if len(columns) > 7 else '',
-            'fecha_registro': str(row[columns[8]]).strip() if len(columns) > 8 else '',
-            'estado': str(row[columns[9]]).strip() if len(columns) > 9 else '',
-            'regimen': str(row[columns[10]]).strip() if len(columns) > 10 else ''
-        }
-        
-        # Clean empty/invalid values
-        for key, value in record_data.items():
-            if value in ['', 'nan', 'None', '.', 'NaN']:
-                record_data[key] = ''
-        
-        return record_data
+            stats['total_imported'] += inserted + updated
+            if inserted or updated:
+                logging.info(f"💾 Imported {inserted:,} new and {updated:,} updated records individually")
+            return inserted, updated
     
     def _process_batch_legacy(self, insert_records, update_records, stats):
         """Legacy batch processing (kept for compatibility)"""
@@ -0,0 +1,117 @@
+import gc
+import os
+import glob
+import shutil
+import tempfile
+
+# Gunicorn settings for multi-worker deployments.
+#
+# With preload_app the master imports the application and loads the RNC
+# snapshot, index, name search index and dataset metadata once, before
+# forking. Workers share those pages copy-on-write (the snapshot itself is
+# an mmap of one file), so memory stays roughly flat as workers are added.
+# gc.freeze() moves the preloaded objects out of the collector's reach,
+# which keeps garbage collection in the workers from touching, and thereby
+# copying, the shared pages.
+#
+# Reloads: when a worker sees a data_version newer than the one it was
+# forked with (see app.ensure_current_data), it sends SIGHUP to the master.
+# The master rebuilds the structures in on_reload, then gunicorn starts
+# fresh workers from it and gracefully stops the old ones. Workers hold off
+# on asking while import or validation jobs are running, since those run on
+# worker threads and would be killed with the old workers.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 300
+# Old workers get this long to finish in-flight requests after a reload
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 120))
+preload_app = True
+
+# Workers write their metrics here so /metrics can sum them (see metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"rnc-metrics-{os.getpid()}"))
+
+# Per-IP limits are counted in one SQLite file shared by all workers (see rate_limiter.py);
+# per-process counters would let each client through once per worker
+_default_rate_limit_db = os.path.join(tempfile.gettempdir(), f"rnc-rate-limits-{os.getpid()}.db")
+os.environ.setdefault('RATE_LIMIT_DB', _default_rate_limit_db)
+
+
+def _reload_markers(server):
+    return glob.glob(os.path.join(tempfile.gettempdir(), f"rnc-reload-{server.pid}-v*"))
+
+
+def _load_shared_data(server):
+    """Warm up in the master and prepare the loaded objects to be shared by forks"""
+    from app import app, warm_up, PRELOADED_ENV
+    from models import db
+    from rnc_service import rnc_service
+
+    os.environ[PRELOADED_ENV] = '1'
+    gc.unfreeze()
+    # Re-read the dataset row now rather than trusting the TTL-cached copy
+    rnc_service.dataset_info_loaded_at = 0.0
+    ready = warm_up(app)
+    rnc_service.fork_version = rnc_service.loaded_version
+    with app.app_context():
+        # Connections must not be shared with the workers
+        db.engine.dispose()
+    gc.collect()
+    gc.freeze()
+    if ready:
+        server.log.info(f"Preloaded RNC data version {rnc_service.loaded_version} for the workers")
+    else:
+        server.log.warning("Preloading RNC data failed; workers will load it themselves")
+    return ready
+
+
+def when_ready(server):
+    from app import app
+    from models import db, fail_interrupted_jobs
+
+    # Jobs run on worker threads; any still marked running died with a previous server
+    with app.app_context():
+        try:
+            fail_interrupted_jobs()
+        except Exception as e:
+            server.log.warning(f"Could not check for interrupted jobs: {e}")
+        finally:
+            db.session.remove()
+    _load_shared_data(server)
+
+
+def on_reload(server):
+    from rnc_service import rnc_service
+
+    ready = _load_shared_data(server)
+    for marker in _reload_markers(server):
+        # Let the next worker that notices the new version ask again when the reload
+        # failed or mapped an older snapshot (the import had not replaced it yet)
+        if not ready or marker.rsplit('-v', 1)[1] != str(rnc_service.fork_version):
+            os.remove(marker)
+
+
+def post_fork(server, worker):
+    from app import app
+    from models import db
+    from metrics import registry
+
+    with app.app_context():
+        # Drop any pooled connections inherited from the master without closing them
+        db.engine.dispose(close=False)
+    # Queries counted during the master's warm-up would otherwise be reported by every worker
+    registry.reset()
+
+
+def on_exit(server):
+    from metrics import registry
+
+    for marker in _reload_markers(server):
+        os.remove(marker)
+    if registry.directory:
+        shutil.rmtree(registry.directory, ignore_errors=True)
+        registry.directory = None
+    if os.environ.get('RATE_LIMIT_DB') == _default_rate_limit_db:
+        # The database plus its -wal and -shm files
+        for path in glob.glob(_default_rate_limit_db + '*'):
+            os.remove(path)
@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from models import db, DataUpdateLog
+
+
+class ImportJobRunner:
+    """Runs DataImporter jobs in the background, tracked through DataUpdateLog.
+
+    Uploads only create a queued log entry and return; the import itself runs
+    on a worker thread with its own application context and database session,
+    so the web worker keeps serving API traffic meanwhile. Progress is written
+    to the log entry after every chunk and can be polled from any process.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import-job')
+
+    def submit(self, app, filename: str, file_path: str, admin_user: str = None, **import_options) -> int:
+        """Queue an import of file_path and return the job (log entry) id"""
+        log_entry = DataUpdateLog()
+        log_entry.filename = filename
+        log_entry.admin_user = admin_user
+        log_entry.status = 'queued'
+        db.session.add(log_entry)
+        db.session.commit()
+
+        self.executor.submit(self._run, app, log_entry.id, file_path, import_options)
+        logging.info(f"📥 Import job {log_entry.id} queued for {filename}")
+        return log_entry.id
+
+    def _run(self, app, job_id: int, file_path: str, import_options: dict):
+        """Execute one import job inside its own application context"""
+        with app.app_context():
+            try:
+                log_entry = db.session.get(DataUpdateLog, job_id)
+                log_entry.status = 'processing'
+                log_entry.started_at = datetime.utcnow()
+                db.session.commit()
+                start_time = time.time()
+
+                def on_progress(stats, percentage):
+                    self._apply_stats(log_entry, stats)
+                    log_entry.progress = percentage
+                    db.session.commit()
+
+                from data_importer import DataImporter
+                importer = DataImporter(progress_callback=on_progress)
+                result = importer.import_from_file(file_path, **import_options)
+                profile = result.pop('profile', None)
+
+                self._apply_stats(log_entry, result)
+                log_entry.import_duration = time.time() - start_time
+                if profile:
+                    log_entry.import_profile = json.dumps(profile)
+                if result.get('encoding_warning'):
+                    log_entry.error_message = result['encoding_warning']
+                log_entry.finished_at = datetime.utcnow()
+                if result.get('total_processed', 0) == 0 and result.get('errors', 0) > 0:
+                    log_entry.status = 'error'
+                    log_entry.error_message = 'No se pudo leer ningún registro del archivo'
+                elif DataImporter.nothing_written(result):
+                    log_entry.status = 'error'
+                    log_entry.error_message = 'No se pudo guardar ningún registro del archivo'
+                elif result.get('failed_batches'):
+                    log_entry.status = 'partial'
+                    log_entry.progress = 100.0
+                    log_entry.error_message = (f"{result['failed_batches']:,} lotes no se pudieron guardar "
+                                               f"({result['errors']:,} registros con error)")
+                else:
+                    log_entry.status = 'success'
+                    log_entry.progress = 100.0
+                db.session.commit()
+                logging.info(f"✅ Import job {job_id} finished: {result}")
+
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"❌ Import job {job_id} failed: {str(e)}")
+                log_entry = db.session.get(DataUpdateLog, job_id)
+                if log_entry:
+                    log_entry.status = 'error'
+                    log_entry.error_message = str(e)
+                    log_entry.finished_at = datetime.utcnow()
+                    db.session.commit()
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _apply_stats(log_entry, stats):
+        """Copy importer statistics onto the job's log entry"""
+        log_entry.rows_parsed = stats.get('total_processed', 0)
+        log_entry.records_imported = stats.get('total_imported', 0)
+        log_entry.records_new = stats.get('new', 0)
+        log_entry.records_updated = stats.get('updated', 0)
+        log_entry.records_removed = stats.get('removed', 0)
+        log_entry.records_checksum_invalid = stats.get('checksum_invalid', 0)
+        log_entry.errors = stats.get('errors', 0)
+        log_entry.detected_encoding = stats.get('encoding')
+
+
+# Global job runner instance
+import_job_runner = ImportJobRunner()
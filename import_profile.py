@@ -0,0 +1,182 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Stages of an import, in pipeline order
+STAGES = ('encoding', 'manifest', 'decode', 'parse', 'clean', 'validate', 'diff', 'write', 'remove', 'refresh')
+
+# Stage names shown on /admin/logs
+STAGE_LABELS = {
+    'encoding': 'Detección de codificación',
+    'manifest': 'Carga de hashes existentes',
+    'decode': 'Lectura y decodificación',
+    'parse': 'Parseo',
+    'clean': 'Limpieza',
+    'validate': 'Validación de RNC',
+    'diff': 'Comparación con existentes',
+    'write': 'Escritura en base de datos',
+    'remove': 'Eliminación de faltantes',
+    'refresh': 'Estadísticas, snapshot e índices',
+}
+
+# Upper bounds (milliseconds) of the batch write latency histogram buckets
+BATCH_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    """A memory figure from /proc/self/status in megabytes (Linux only)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset this process's peak RSS counter so it covers only what follows (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in megabytes"""
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class ImportProfile:
+    """Where the time of one import went.
+
+    Each stage accumulates wall time and the rows it handled across all
+    chunks, so the report gives per-stage seconds, share of the total and
+    rows per second. Batch writes are additionally kept individually for a
+    latency histogram. The peak RSS covers the import alone where the kernel
+    lets us reset the counter, and the life of the process otherwise.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List] = {}  # name -> [seconds, rows]
+        self.batch_latencies: List[float] = []
+        self.peak_rss_scope = 'import' if reset_peak_rss() else 'process'
+        self.rss_start_mb = _proc_status_mb('VmRSS')
+
+    def add(self, name: str, seconds: float, rows: int = 0):
+        """Charge time (and optionally rows) to a stage"""
+        entry = self.stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += rows
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """Time the enclosed block as part of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, rows)
+
+    def seconds(self, name: str) -> float:
+        """Time charged to a stage so far"""
+        return self.stages.get(name, (0.0, 0))[0]
+
+    def record_batch(self, seconds: float, rows: int):
+        """Record one batch write (also charged to the write stage)"""
+        self.batch_latencies.append(seconds)
+        self.add('write', seconds, rows)
+
+    def batch_histogram(self) -> Dict[str, int]:
+        """Batch write counts per latency bucket, keyed by the bucket's upper bound in ms"""
+        counts = dict.fromkeys([str(bound) for bound in BATCH_LATENCY_BUCKETS_MS] + ['+Inf'], 0)
+        for latency in self.batch_latencies:
+            milliseconds = latency * 1000
+            bucket = next((str(bound) for bound in BATCH_LATENCY_BUCKETS_MS if milliseconds <= bound), '+Inf')
+            counts[bucket] += 1
+        return counts
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable report"""
+        total = time.perf_counter() - self.started
+        ordered = [name for name in STAGES if name in self.stages]
+        ordered += [name for name in self.stages if name not in STAGES]
+        stages = {}
+        for name in ordered:
+            seconds, rows = self.stages[name]
+            stages[name] = {
+                "seconds": round(seconds, 3),
+                "share": round(seconds / total * 100, 1) if total else 0.0,
+                "rows": rows,
+                "rows_per_second": round(rows / seconds) if rows and seconds > 0 else None
+            }
+
+        latencies = sorted(latency * 1000 for latency in self.batch_latencies)
+        batches = {"count": len(latencies), "histogram_ms": self.batch_histogram()}
+        if latencies:
+            batches.update({
+                "mean_ms": round(sum(latencies) / len(latencies), 2),
+                "p50_ms": round(latencies[len(latencies) // 2], 2),
+                "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+                "max_ms": round(latencies[-1], 2)
+            })
+
+        return {
+            "total_seconds": round(total, 3),
+            "stages": stages,
+            "batch_writes": batches,
+            "rss_start_mb": self.rss_start_mb,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_scope": self.peak_rss_scope
+        }
+
+    def summary(self) -> str:
+        """One-line breakdown for the logs"""
+        return ' · '.join(f"{name} {seconds:.2f}s" for name, (seconds, _) in self.stages.items() if seconds >= 0.005)
+
+
+class TimedReader:
+    """Text handle wrapper that charges time spent in read() to a stage.
+
+    pandas pulls text through ``read``; on a decoded handle that time is the
+    file I/O plus the codec, which is what the ``decode`` stage measures.
+    Everything else is delegated to the wrapped handle.
+    """
+
+    def __init__(self, handle, profile: ImportProfile, stage: str = 'decode'):
+        self._handle = handle
+        self._profile = profile
+        self._stage = stage
+
+    def read(self, size: int = -1):
+        start = time.perf_counter()
+        data = self._handle.read(size)
+        self._profile.add(self._stage, time.perf_counter() - start)
+        return data
+
+    def readline(self, size: int = -1):
+        start = time.perf_counter()
+        line = self._handle.readline(size)
+        self._profile.add(self._stage, time.perf_counter() - start)
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def __getattr__(self, name):
+        return getattr(self._handle, name)
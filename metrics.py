@@ -0,0 +1,427 @@
+import os
+import hmac
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import timezone
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import Blueprint, Flask, Response, g, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the per-request database query count histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# Directory shared by all worker processes; each one writes its aggregates to <pid>.json
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Seconds between writes of this process's aggregates to METRICS_DIR
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# name: (type, help)
+METRICS = {
+    'rnc_http_requests_total': ('counter', 'API requests by route, method and status code.'),
+    'rnc_http_request_duration_seconds': ('histogram', 'API request latency by route and method.'),
+    'rnc_db_queries_total': ('counter', 'Database queries by route ("background" outside requests).'),
+    'rnc_db_query_duration_seconds_total': ('counter', 'Time spent in database queries by route.'),
+    'rnc_db_queries_per_request': ('histogram', 'Database queries issued per API request.'),
+    'rnc_rate_limit_rejections_total': ('counter', 'Requests rejected with 429, by limit kind and token name.'),
+    'rnc_result_cache_requests_total': ('counter', 'Lookup result cache lookups by outcome.'),
+    'rnc_token_cache_requests_total': ('counter', 'API token cache lookups by outcome.'),
+    'rnc_result_cache_hit_ratio': ('gauge', 'Share of lookup result cache lookups that were hits.'),
+    'rnc_token_cache_hit_ratio': ('gauge', 'Share of API token cache lookups that were hits.'),
+    'rnc_result_cache_entries': ('gauge', 'Entries in the lookup result caches of live processes.'),
+    'rnc_import_jobs': ('gauge', 'Import jobs by status (queued or processing).'),
+    'rnc_import_job_progress_percent': ('gauge', 'Progress of the running import job.'),
+    'rnc_import_job_rows_parsed': ('gauge', 'Rows parsed so far by the running import job.'),
+    'rnc_last_import_duration_seconds': ('gauge', 'Duration of the last finished import.'),
+    'rnc_last_import_timestamp_seconds': ('gauge', 'Unix time the last import finished.'),
+    'rnc_validation_jobs': ('gauge', 'File validation jobs by status (queued or processing).'),
+    'rnc_data_version': ('gauge', 'Version of the loaded dataset.'),
+    'rnc_indexed_records': ('gauge', 'Records in the in-memory RNC index.'),
+    'rnc_metrics_processes': ('gauge', 'Live processes whose metrics are aggregated here.'),
+}
+
+LABEL_NAMES = {
+    'rnc_http_requests_total': ('route', 'method', 'status'),
+    'rnc_http_request_duration_seconds': ('route', 'method'),
+    'rnc_db_queries_total': ('route',),
+    'rnc_db_query_duration_seconds_total': ('route',),
+    'rnc_db_queries_per_request': ('route',),
+    'rnc_rate_limit_rejections_total': ('kind', 'token'),
+    'rnc_result_cache_requests_total': ('result',),
+    'rnc_token_cache_requests_total': ('result',),
+    'rnc_import_jobs': ('status',),
+    'rnc_validation_jobs': ('status',),
+}
+
+HISTOGRAM_BUCKETS = {
+    'rnc_http_request_duration_seconds': LATENCY_BUCKETS,
+    'rnc_db_queries_per_request': QUERY_COUNT_BUCKETS,
+}
+
+Key = Tuple[str, Tuple[str, ...]]
+
+
+class _Shard:
+    """Aggregates written by a single thread"""
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, List[float]] = {}  # bucket counts..., sum, count
+
+
+class MetricsRegistry:
+    """In-process counters and histograms, sharded per thread.
+
+    Each thread updates only its own shard, so recording a sample takes no
+    lock; the lock is only held to register a new thread's shard. A scrape
+    merges copies of all shards. With METRICS_DIR set, every process also
+    writes its merged aggregates to ``<pid>.json`` there at most every
+    METRICS_FLUSH_INTERVAL seconds, and a scrape sums the files of all
+    processes, so any worker can answer for the whole deployment.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def reset(self):
+        """Forget everything recorded so far (in a freshly forked worker)"""
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+
+    def inc(self, name: str, labels: Tuple[str, ...] = (), value: float = 1):
+        """Add to a counter"""
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Tuple[str, ...], value: float):
+        """Record a histogram sample"""
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            buckets = HISTOGRAM_BUCKETS[name]
+            entry = histograms[key] = [0] * (len(buckets) + 3)
+        entry[bisect_left(HISTOGRAM_BUCKETS[name], value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def collect(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]], Dict[Key, float]]:
+        """Merged counters, histograms and gauges of this process"""
+        counters: Dict[Key, float] = {}
+        histograms: Dict[Key, List[float]] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # dict.copy() is atomic, so the owning thread can keep writing
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, entry in shard.histograms.copy().items():
+                merged = histograms.setdefault(key, [0] * len(entry))
+                for position, value in enumerate(list(entry)):
+                    merged[position] += value
+        process_counters, gauges = _process_samples()
+        for key, value in process_counters.items():
+            counters[key] = counters.get(key, 0) + value
+        return counters, histograms, gauges
+
+    def dump(self):
+        """Write this process's aggregates to METRICS_DIR"""
+        if not self.directory:
+            return
+        self._last_dump = time.monotonic()
+        counters, histograms, gauges = self.collect()
+        payload = {
+            'pid': os.getpid(),
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), entry] for (name, labels), entry in histograms.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in gauges.items()],
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as handle:
+                json.dump(payload, handle)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write metrics to {self.directory}: {str(e)}")
+
+    def maybe_dump(self):
+        """Dump if the flush interval has elapsed"""
+        if self.directory and time.monotonic() - self._last_dump >= METRICS_FLUSH_INTERVAL:
+            self.dump()
+
+    def aggregate(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]], Dict[Key, float], int]:
+        """Counters, histograms and gauges summed over every process, plus the live process count"""
+        counters, histograms, gauges = self.collect()
+        processes = 1
+        if not self.directory or not os.path.isdir(self.directory):
+            return counters, histograms, gauges, processes
+
+        self.dump()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json') or filename == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as handle:
+                    payload = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            # Counters of exited workers still count; their gauges no longer do
+            for name, labels, value in payload['counters']:
+                key = (name, tuple(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, entry in payload['histograms']:
+                merged = histograms.setdefault((name, tuple(labels)), [0] * len(entry))
+                for position, value in enumerate(entry):
+                    merged[position] += value
+            if _pid_alive(payload['pid']):
+                processes += 1
+                for name, labels, value in payload['gauges']:
+                    key = (name, tuple(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+        return counters, histograms, gauges, processes
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _process_samples() -> Tuple[Dict[Key, float], Dict[Key, float]]:
+    """Counters and gauges read from the caches of this process"""
+    from rnc_service import rnc_service
+    from token_cache import token_cache
+    result_cache = rnc_service.result_cache
+    counters = {
+        ('rnc_result_cache_requests_total', ('hit',)): result_cache.hits,
+        ('rnc_result_cache_requests_total', ('miss',)): result_cache.misses,
+        ('rnc_token_cache_requests_total', ('hit',)): token_cache.hits,
+        ('rnc_token_cache_requests_total', ('miss',)): token_cache.misses,
+    }
+    gauges = {('rnc_result_cache_entries', ()): len(result_cache)}
+    return counters, gauges
+
+
+registry = MetricsRegistry(METRICS_DIR)
+
+# Per-thread state of the request being served, for attributing database queries
+_request_state = threading.local()
+
+
+def begin_request():
+    """Start counting database queries for the current thread's request"""
+    _request_state.queries = 0
+    _request_state.query_time = 0.0
+    _request_state.active = True
+
+
+def end_request(route: str, method: str, status: int, seconds: float):
+    """Record a finished API request"""
+    registry.inc('rnc_http_requests_total', (route, method, str(status)))
+    registry.observe('rnc_http_request_duration_seconds', (route, method), seconds)
+    if getattr(_request_state, 'active', False):
+        _request_state.active = False
+        registry.observe('rnc_db_queries_per_request', (route,), _request_state.queries)
+        if _request_state.queries:
+            registry.inc('rnc_db_queries_total', (route,), _request_state.queries)
+            registry.inc('rnc_db_query_duration_seconds_total', (route,), _request_state.query_time)
+    registry.maybe_dump()
+
+
+def record_rejection(kind: str, token_name: str = ''):
+    """Count a request rejected by a rate limit ('token' or 'ip')"""
+    registry.inc('rnc_rate_limit_rejections_total', (kind, token_name))
+
+
+# Database query hooks --------------------------------------------------------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if getattr(_request_state, 'active', False):
+        _request_state.queries += 1
+        _request_state.query_time += elapsed
+    else:
+        registry.inc('rnc_db_queries_total', ('background',))
+        registry.inc('rnc_db_query_duration_seconds_total', ('background',), elapsed)
+
+
+# Flask integration -----------------------------------------------------------
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def init_app(app: Flask, blueprint_names: Iterable[str] = ('api',)):
+    """Record requests to the given blueprints and write this process's metrics at exit"""
+    blueprint_names = set(blueprint_names)
+
+    @app.before_request
+    def start_request_timer():
+        if request.blueprint in blueprint_names:
+            g.metrics_started = time.perf_counter()
+            begin_request()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            end_request(route, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(error):
+        # after_request is skipped when a view raises
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            end_request(route, request.method, 500, time.perf_counter() - started)
+
+    app.register_blueprint(metrics_bp)
+    atexit.register(registry.dump)
+
+
+def _database_gauges() -> Dict[Key, float]:
+    """Job, import and dataset gauges read from the database and the service"""
+    from sqlalchemy import func
+    from models import db, DataUpdateLog, ValidationJob
+    from rnc_service import rnc_service
+
+    gauges: Dict[Key, float] = {}
+    try:
+        for status in ('queued', 'processing'):
+            gauges[('rnc_import_jobs', (status,))] = 0
+            gauges[('rnc_validation_jobs', (status,))] = 0
+        for status, count in db.session.query(DataUpdateLog.status, func.count()).filter(
+                DataUpdateLog.status.in_(('queued', 'processing'))).group_by(DataUpdateLog.status):
+            gauges[('rnc_import_jobs', (status,))] = count
+        for status, count in db.session.query(ValidationJob.status, func.count()).filter(
+                ValidationJob.status.in_(('queued', 'processing'))).group_by(ValidationJob.status):
+            gauges[('rnc_validation_jobs', (status,))] = count
+
+        running = DataUpdateLog.query.filter_by(status='processing').order_by(DataUpdateLog.id.desc()).first()
+        gauges[('rnc_import_job_progress_percent', ())] = (running.progress or 0) if running else 0
+        gauges[('rnc_import_job_rows_parsed', ())] = (running.rows_parsed or 0) if running else 0
+
+        last = DataUpdateLog.query.filter(DataUpdateLog.finished_at.isnot(None)).order_by(
+            DataUpdateLog.finished_at.desc()).first()
+        if last:
+            gauges[('rnc_last_import_duration_seconds', ())] = last.import_duration or 0
+            # finished_at is naive UTC
+            gauges[('rnc_last_import_timestamp_seconds', ())] = last.finished_at.replace(tzinfo=timezone.utc).timestamp()
+
+        gauges[('rnc_data_version', ())] = rnc_service.get_data_version()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Could not read metrics from the database: {str(e)}")
+    if rnc_service.index is not None:
+        gauges[('rnc_indexed_records', ())] = len(rnc_service.index)
+    return gauges
+
+
+def _hit_ratio(counters: Dict[Key, float], name: str) -> float:
+    hits = counters.get((name, ('hit',)), 0)
+    lookups = hits + counters.get((name, ('miss',)), 0)
+    return hits / lookups if lookups else 0.0
+
+
+def _format_labels(name: str, labels: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(LABEL_NAMES.get(name, ()), labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    counters, histograms, gauges, processes = registry.aggregate()
+    gauges.update(_database_gauges())
+    gauges[('rnc_result_cache_hit_ratio', ())] = _hit_ratio(counters, 'rnc_result_cache_requests_total')
+    gauges[('rnc_token_cache_hit_ratio', ())] = _hit_ratio(counters, 'rnc_token_cache_requests_total')
+    gauges[('rnc_metrics_processes', ())] = processes
+
+    samples: Dict[str, List[Tuple[Tuple[str, ...], object]]] = {}
+    for source in (counters, histograms, gauges):
+        for (name, labels), value in source.items():
+            samples.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        if name not in samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(samples[name], key=lambda sample: sample[0]):
+            if metric_type != 'histogram':
+                lines.append(f"{name}{_format_labels(name, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS[name] + ('+Inf',), value[:-2]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(name, labels, ('le', str(bound)))} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(name, labels)} {_format_value(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(name, labels)} {_format_value(value[-1])}")
+    return '\n'.join(lines) + '\n'
+
+
+def _scrape_allowed() -> bool:
+    """Whether the request may read the metrics: METRICS_TOKEN bearer or an admin session"""
+    expected = os.environ.get('METRICS_TOKEN')
+    if expected and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {expected}"):
+        return True
+    # Token names appear in the labels, so metrics are never public
+    return bool(session.get('admin_logged_in'))
+
+
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint for METRICS_TOKEN holders and logged-in admins"""
+    if not _scrape_allowed():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
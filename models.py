@@ -1,4 +1,7 @@
+import json
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -29,34 +32,39 @@ class RNCRecord(db.Model):
     campo_7 = db.Column(db.Text)  # Additional info
     campo_8 = db.Column(db.Text)  # Additional info
     
+    # Hash of the imported values, used to skip unchanged rows on reimport
+    content_hash = db.Column(db.BigInteger)
+    
     def __repr__(self):
         return f'<RNCRecord {self.rnc}: {self.nombre}>'
     
     def to_dict(self):
         """Convert RNC record to dictionary for API responses"""
-        result = {}
-        
-        # Add main fields if they have values
-        if self.nombre and self.nombre.strip():
-            result['nombre'] = self.nombre.strip()
-        if self.estado and self.estado.strip():
-            result['estado'] = self.estado.strip()
-        if self.categoria and self.categoria.strip():
-            result['categoria'] = self.categoria.strip()
-        if self.actividad_economica and self.actividad_economica.strip():
-            result['actividad_economica'] = self.actividad_economica.strip()
-        if self.fecha_registro and self.fecha_registro.strip():
-            result['fecha_registro'] = self.fecha_registro.strip()
-        if self.regimen and self.regimen.strip():
-            result['regimen'] = self.regimen.strip()
-            
-        # Add additional fields if they contain meaningful data
-        for i, field in enumerate([self.campo_3, self.campo_4, self.campo_5, 
-                                 self.campo_6, self.campo_7, self.campo_8], 3):
-            if field and field.strip() and field.strip() != '.':
-                result[f'campo_{i}'] = field.strip()
-        
-        return result
+        return clean_record_fields({field: getattr(self, field) for field in RECORD_FIELDS})
+
+
+# Public record fields in the order they appear in API responses
+RECORD_FIELDS = (
+    'nombre', 'estado', 'categoria', 'actividad_economica', 'fecha_registro', 'regimen',
+    'campo_3', 'campo_4', 'campo_5', 'campo_6', 'campo_7', 'campo_8',
+)
+
+
+def clean_record_fields(values):
+    """Strip record values and drop empty ones, as returned by the API"""
+    result = {}
+    
+    for field in RECORD_FIELDS:
+        value = values.get(field)
+        if not value or not value.strip():
+            continue
+        value = value.strip()
+        # Additional fields only count if they contain meaningful data
+        if field.startswith('campo_') and value == '.':
+            continue
+        result[field] = value
+    
+    return result
 
 
 class AdminUser(db.Model):
@@ -147,11 +155,213 @@ class DataUpdateLog(db.Model):
     records_imported = db.Column(db.Integer, default=0)
     records_updated = db.Column(db.Integer, default=0)
     records_new = db.Column(db.Integer, default=0)
+    records_removed = db.Column(db.Integer, default=0)
+    records_checksum_invalid = db.Column(db.Integer, default=0)  # Imported RNCs with a wrong check digit
+    detected_encoding = db.Column(db.String(20))
     import_duration = db.Column(db.Float)  # seconds
     admin_user = db.Column(db.String(80))
-    status = db.Column(db.String(20), default='success')  # success, error, partial
+    status = db.Column(db.String(20), default='success')  # queued, processing, success, error, partial
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Live progress of background import jobs
+    rows_parsed = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Integer, default=0)
+    progress = db.Column(db.Float, default=0)  # percent of the file read
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # JSON report of per-stage timings, batch write latencies and peak RSS (see import_profile.py)
+    import_profile = db.Column(db.Text)
+    
+    def is_running(self):
+        """Check if the import job has not finished yet"""
+        return self.status in ('queued', 'processing')
+    
+    def get_import_profile(self):
+        """Decoded import profile, or None for imports that predate it"""
+        return json.loads(self.import_profile) if self.import_profile else None
+    
+    def to_job_dict(self):
+        """Convert log entry to the import job progress payload"""
+        end_time = self.finished_at or datetime.utcnow()
+        elapsed = (end_time - self.started_at).total_seconds() if self.started_at else 0
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "running": self.is_running(),
+            "progress": round(self.progress or 0, 1),
+            "rows_parsed": self.rows_parsed or 0,
+            "records_imported": self.records_imported or 0,
+            "records_new": self.records_new or 0,
+            "records_updated": self.records_updated or 0,
+            "records_removed": self.records_removed or 0,
+            "records_checksum_invalid": self.records_checksum_invalid or 0,
+            "errors": self.errors or 0,
+            "encoding": self.detected_encoding,
+            "elapsed_seconds": round(elapsed, 1),
+            "rows_per_second": round((self.rows_parsed or 0) / elapsed, 1) if elapsed > 0 else 0,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error_message": self.error_message
+        }
+    
+    def __repr__(self):
+        return f'<DataUpdateLog {self.filename}: {self.records_imported} records>'
+
+
+class DatasetInfo(db.Model):
+    """Metadata of the loaded DGII dataset, recomputed at the end of each import"""
+    __tablename__ = 'dataset_info'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Single row with id 1
+    total_records = db.Column(db.Integer, default=0)
+    active_records = db.Column(db.Integer, default=0)
+    estado_counts = db.Column(db.Text)  # JSON object of record counts per estado
+    sample_rnc = db.Column(db.String(11))
+    data_version = db.Column(db.Integer, default=0)  # Incremented whenever the data changes
+    last_import_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert dataset metadata to dictionary"""
+        return {
+            "total_records": self.total_records or 0,
+            "active_records": self.active_records or 0,
+            "estado_counts": json.loads(self.estado_counts) if self.estado_counts else {},
+            "sample_rnc": self.sample_rnc,
+            "data_version": self.data_version or 0,
+            "last_import": self.last_import_at.isoformat() if self.last_import_at else None
+        }
+    
+    def __repr__(self):
+        return f'<DatasetInfo v{self.data_version}: {self.total_records} records>'
+
+
+class ValidationJob(db.Model):
+    """File validation job submitted through the API"""
+    __tablename__ = 'validation_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    api_token_id = db.Column(db.Integer, db.ForeignKey('api_tokens.id', ondelete='SET NULL'))
+    status = db.Column(db.String(20), default='queued')  # queued, processing, success, error
+    rows_processed = db.Column(db.Integer, default=0)
+    rows_found = db.Column(db.Integer, default=0)
+    rows_not_found = db.Column(db.Integer, default=0)
+    rows_invalid = db.Column(db.Integer, default=0)
+    progress = db.Column(db.Float, default=0)  # percent of the file read
+    result_path = db.Column(db.String(500))
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def is_running(self):
+        """Check if the validation job has not finished yet"""
+        return self.status in ('queued', 'processing')
+    
+    def to_job_dict(self):
+        """Convert the job to its progress payload"""
+        end_time = self.finished_at or datetime.utcnow()
+        elapsed = (end_time - self.started_at).total_seconds() if self.started_at else 0
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "running": self.is_running(),
+            "progress": round(self.progress or 0, 1),
+            "rows_processed": self.rows_processed or 0,
+            "rows_found": self.rows_found or 0,
+            "rows_not_found": self.rows_not_found or 0,
+            "rows_invalid": self.rows_invalid or 0,
+            "result_ready": self.status == 'success' and bool(self.result_path),
+            "elapsed_seconds": round(elapsed, 1),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error_message": self.error_message
+        }
+    
+    def __repr__(self):
+        return f'<ValidationJob {self.id}: {self.filename}>'
+
+
+class RequestProfile(db.Model):
+    """cProfile and SQL report of one profiled request (see request_profiler.py)"""
+    __tablename__ = 'request_profiles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    query_string = db.Column(db.String(500))
+    endpoint = db.Column(db.String(200))
+    status_code = db.Column(db.Integer)
+    duration_ms = db.Column(db.Float, index=True)
+    sql_count = db.Column(db.Integer, default=0)
+    sql_time_ms = db.Column(db.Float, default=0)
+    sql_statements = db.Column(db.Text)  # JSON list of statements with their timings
+    stats_text = db.Column(db.Text)  # pstats output sorted by cumulative time
+    trigger = db.Column(db.String(20))  # header, admin, sample
+    admin_user = db.Column(db.String(80))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def get_sql_statements(self):
+        """Decoded list of captured SQL statements"""
+        return json.loads(self.sql_statements) if self.sql_statements else []
     
     def __repr__(self):
-        return f'<DataUpdateLog {self.filename}: {self.records_imported} records>'
\ No newline at end of file
+        return f'<RequestProfile {self.id}: {self.method} {self.path} {self.duration_ms}ms>'
+
+
+def upgrade_schema():
+    """Add columns introduced after a table was first created.
+
+    ``db.create_all()`` only creates missing tables, so existing deployments
+    get new nullable columns added here with ALTER TABLE.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logging.info(f"Added column {table.name}.{column.name} ({column_type})")
+    db.session.commit()
+
+
+# Jobs still marked running after this long are assumed to have died with their worker
+JOB_STALE_AFTER = timedelta(hours=6)
+
+
+def active_job_count() -> int:
+    """Import and validation jobs that are queued or running in some worker"""
+    running = ('queued', 'processing')
+    since = datetime.utcnow() - JOB_STALE_AFTER
+    return sum(
+        model.query.filter(model.status.in_(running), model.created_at >= since).count()
+        for model in (DataUpdateLog, ValidationJob)
+    )
+
+
+def fail_interrupted_jobs() -> int:
+    """Mark jobs left queued or processing by server processes that are gone as failed.
+
+    Only safe while no worker of this deployment is running, i.e. at startup.
+    """
+    now = datetime.utcnow()
+    failed = 0
+    for model in (DataUpdateLog, ValidationJob):
+        for job in model.query.filter(model.status.in_(('queued', 'processing'))):
+            job.status = 'error'
+            job.error_message = 'Interrumpido: el servidor se reinició antes de terminar'
+            job.finished_at = now
+            failed += 1
+    db.session.commit()
+    if failed:
+        logging.warning(f"Marked {failed} interrupted job(s) as failed")
+    return failed
@@ -0,0 +1,205 @@
+import re
+import logging
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+
+# How many substring candidates to rank per suggestion requested
+CONTAINS_POOL_FACTOR = 5
+
+# Legal form words ignored when comparing two company names
+LEGAL_FORM_WORDS = frozenset({
+    'S', 'A', 'SA', 'SAS', 'SRL', 'EIRL', 'C', 'POR', 'CXA', 'CPORA', 'SC', 'INC', 'LTD', 'LLC',
+})
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Normalize a company name for matching: no accents, uppercase, single spaces"""
+    if not name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', name.upper())
+    ascii_name = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', ascii_name).strip()
+
+
+def names_match(given: Optional[str], official: Optional[str]) -> bool:
+    """Loosely compare a user-supplied company name with the registered one.
+
+    Names match when, after normalization and dropping legal form words,
+    they are equal or one contains the other on word boundaries.
+    """
+    given_words = [word for word in normalize_name(given).split() if word not in LEGAL_FORM_WORDS]
+    official_words = [word for word in normalize_name(official).split() if word not in LEGAL_FORM_WORDS]
+    if not given_words or not official_words:
+        return False
+    given_name = ' ' + ' '.join(given_words) + ' '
+    official_name = ' ' + ' '.join(official_words) + ' '
+    return given_name in official_name or official_name in given_name
+
+
+def name_trigrams(normalized: str) -> set:
+    """Trigrams of a normalized name, skipping the ones that span a space"""
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)
+            if ' ' not in normalized[i:i + 3]}
+
+
+class AutocompleteIndex:
+    """Prefix autocomplete over normalized names, ranked by estado then name.
+
+    Document ids are kept in two arrays sorted by normalized name: one for
+    active companies and one for everything else. A prefix maps to a
+    contiguous slice of each array (two binary searches apiece), so the top
+    k suggestions are the head of the active slice followed by the head of
+    the inactive one, without scanning or sorting at query time.
+    """
+
+    def __init__(self, names: 'NameSearchIndex', active: bytearray):
+        self.names = names
+        ranked = sorted((doc for doc in range(len(names)) if names.name(doc)), key=names.name)
+        self.active = array('I', (doc for doc in ranked if active[doc]))
+        self.inactive = array('I', (doc for doc in ranked if not active[doc]))
+
+    def _prefix_slice(self, docs: array, prefix: str, limit: int) -> List[int]:
+        """First ``limit`` documents of a sorted array whose name starts with prefix"""
+        low = bisect_left(docs, prefix, key=self.names.name)
+        high = bisect_left(docs, prefix + '\uffff', lo=low, key=self.names.name)
+        return list(docs[low:min(high, low + limit)])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[int]:
+        """Document ids whose normalized name starts with the prefix"""
+        if not prefix:
+            return []
+        docs = self._prefix_slice(self.active, prefix, limit)
+        if len(docs) < limit:
+            docs.extend(self._prefix_slice(self.inactive, prefix, limit - len(docs)))
+        return docs
+
+
+class NameSearchIndex:
+    """In-process substring search over company names.
+
+    Normalized names are concatenated into a single newline-separated corpus
+    string and every record gets a posting in a trigram inverted index. A
+    query walks the shortest posting list of its trigrams and verifies each
+    candidate with ``str.find`` on the corpus, so the cost depends on how
+    selective the query is rather than on the size of the table. Document
+    ids are snapshot positions, which is where result payloads come from.
+    """
+
+    def __init__(self, snapshot, corpus: str, starts: array, postings: Dict[str, array],
+                 active: bytearray):
+        self.snapshot = snapshot
+        self.corpus = corpus
+        self.starts = starts
+        self.postings = postings
+        self.active = active
+        self.autocomplete = AutocompleteIndex(self, active)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> 'NameSearchIndex':
+        """Build the index from the names stored in an RNCSnapshot"""
+        start_time = time.time()
+        names = []
+        starts = array('I')
+        postings = defaultdict(lambda: array('I'))
+        active = bytearray()
+        offset = 0
+
+        for doc in range(len(snapshot)):
+            fields = snapshot.record_at(doc)
+            normalized = normalize_name(fields.get('nombre'))
+            names.append(normalized)
+            active.append(1 if fields.get('estado', '').upper() == 'ACTIVO' else 0)
+            starts.append(offset)
+            offset += len(normalized) + 1
+            for trigram in name_trigrams(normalized):
+                postings[trigram].append(doc)
+        starts.append(offset)
+
+        index = cls(snapshot, '\n'.join(names) + '\n', starts, dict(postings), active)
+        logging.info(f"Name index built with {len(index):,} names and {len(postings):,} trigrams "
+                     f"in {time.time() - start_time:.2f}s")
+        return index
+
+    def name(self, doc: int) -> str:
+        """Normalized name of a document"""
+        return self.corpus[self.starts[doc]:self.starts[doc + 1] - 1]
+
+    def _matches(self, doc: int, query: str) -> bool:
+        """Check whether the normalized name of a document contains the query"""
+        return self.corpus.find(query, self.starts[doc], self.starts[doc + 1] - 1) != -1
+
+    def _scan(self, query: str, limit: int) -> List[int]:
+        """Find matching documents by scanning the corpus directly"""
+        docs = []
+        position = self.corpus.find(query)
+        while position != -1 and len(docs) < limit:
+            doc = self._doc_at(position)
+            docs.append(doc)
+            # Continue after the end of this name so each document appears once
+            position = self.corpus.find(query, self.starts[doc + 1])
+        return docs
+
+    def _doc_at(self, position: int) -> int:
+        """Document id whose name contains a corpus position"""
+        return bisect_right(self.starts, position) - 1
+
+    def search_docs(self, query: str, limit: int = 10) -> List[int]:
+        """Document ids whose name contains the normalized query, in snapshot order"""
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+
+        trigrams = name_trigrams(normalized)
+        if not trigrams:
+            return self._scan(normalized, limit)
+
+        candidate_lists = []
+        for trigram in trigrams:
+            docs = self.postings.get(trigram)
+            if docs is None:
+                return []
+            candidate_lists.append(docs)
+
+        docs = []
+        for doc in min(candidate_lists, key=len):
+            if self._matches(doc, normalized):
+                docs.append(doc)
+                if len(docs) >= limit:
+                    break
+        return docs
+
+    def suggestion(self, doc: int) -> Dict:
+        """Build the search_by_name payload for a document"""
+        fields = self.snapshot.record_at(doc)
+        suggestion = {
+            "rnc": self.snapshot.key_at(doc),
+            "nombre": fields.get('nombre', ''),
+            "estado": fields.get('estado', ''),
+        }
+        if fields.get('actividad_economica'):
+            suggestion["actividad_economica"] = fields['actividad_economica']
+        return suggestion
+
+    def _rank(self, doc: int):
+        """Sort key putting active companies first, then by name"""
+        return (not self.active[doc], self.name(doc), doc)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Companies matching the query: name prefix matches first, then names containing it"""
+        docs = self.autocomplete.complete(normalize_name(query), limit)
+        if len(docs) < limit:
+            seen = set(docs)
+            # Rank a wider candidate pool so active companies surface first
+            candidates = self.search_docs(query, (limit + len(docs)) * CONTAINS_POOL_FACTOR)
+            contains = [doc for doc in candidates if doc not in seen]
+            docs.extend(sorted(contains, key=self._rank)[:limit - len(docs)])
+        return [self.suggestion(doc) for doc in docs]
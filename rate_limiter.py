@@ -0,0 +1,172 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Most client addresses tracked by the in-memory limiter
+DEFAULT_MAX_KEYS = 100000
+
+# Seconds a request waits for the shared rate limit file before falling back to memory
+SQLITE_BUSY_TIMEOUT = 0.5
+
+# Seconds between repeated warnings about an unavailable shared store
+STORE_ERROR_LOG_INTERVAL = 60
+
+
+def _window_count(window_start: float, current: int, previous: int, now: float, window: int) -> float:
+    """Estimated requests in the sliding window ending now.
+
+    The previous fixed window is weighted by how much of it still overlaps
+    the sliding window, which approximates a per-request log with two
+    counters per client.
+    """
+    elapsed = now - window_start
+    return previous * max(0.0, (window - elapsed) / window) + current
+
+
+class SlidingWindowLimiter:
+    """Per-process sliding-window rate limiter with a bounded number of clients.
+
+    Each client costs one fixed-size entry (window start plus two counters)
+    in an LRU-ordered dict; once ``max_keys`` clients are tracked the one
+    seen least recently is evicted, so scanning traffic cannot grow memory.
+    """
+
+    def __init__(self, limit: int, window: int = 60, max_keys: int = DEFAULT_MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        """Record a request for key and return whether it is within the limit"""
+        now = time.time()
+        window_start = now - now % self.window
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [window_start, 0, 0]
+                self._entries[key] = entry
+                if len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+                if entry[0] != window_start:
+                    # Roll the window; anything older than one window is dropped
+                    entry[2] = entry[1] if window_start - entry[0] == self.window else 0
+                    entry[0], entry[1] = window_start, 0
+
+            if _window_count(entry[0], entry[1], entry[2], now, self.window) >= self.limit:
+                return False
+            entry[1] += 1
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteRateLimiter:
+    """Sliding-window rate limiter shared by every worker through a SQLite file.
+
+    Counters live in one small table keyed by client, updated inside a
+    ``BEGIN IMMEDIATE`` transaction so concurrent workers serialize on the
+    file lock. Rows idle for two windows are pruned periodically, which keeps
+    the file bounded by the number of recently active clients. When the file
+    stays locked past a short busy timeout (or cannot be used at all), the
+    request is counted by a per-process limiter instead of failing.
+    """
+
+    def __init__(self, path: str, limit: int, window: int = 60, prune_interval: int = 300):
+        self.path = path
+        self.limit = limit
+        self.window = window
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._last_prune = 0.0
+        self._fallback = SlidingWindowLimiter(limit, window)
+        self._last_error_log = 0.0
+        # Throwaway connection: one kept open here could leak into forked workers
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "client TEXT PRIMARY KEY, window_start INTEGER NOT NULL, "
+                "current INTEGER NOT NULL, previous INTEGER NOT NULL)"
+            )
+        finally:
+            connection.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        """SQLite connection for the calling thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def allow(self, key: str) -> bool:
+        """Record a request for key and return whether it is within the limit"""
+        try:
+            return self._allow_shared(key)
+        except sqlite3.Error as e:
+            now = time.monotonic()
+            if now - self._last_error_log >= STORE_ERROR_LOG_INTERVAL:
+                self._last_error_log = now
+                logging.warning(f"Rate limit store {self.path} unavailable, limiting in memory: {str(e)}")
+            return self._fallback.allow(key)
+
+    def _allow_shared(self, key: str) -> bool:
+        """allow() against the shared SQLite file; raises sqlite3.Error when it cannot be used"""
+        now = time.time()
+        window_start = int(now - now % self.window)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window_start, current, previous FROM rate_limits WHERE client = ?", (key,)
+            ).fetchone()
+            if row is None:
+                current, previous = 0, 0
+            elif row[0] == window_start:
+                current, previous = row[1], row[2]
+            else:
+                current, previous = 0, row[1] if window_start - row[0] == self.window else 0
+
+            allowed = _window_count(window_start, current, previous, now, self.window) < self.limit
+            if allowed:
+                current += 1
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limits (client, window_start, current, previous) "
+                "VALUES (?, ?, ?, ?)",
+                (key, window_start, current, previous)
+            )
+            if now - self._last_prune >= self.prune_interval:
+                self._last_prune = now
+                connection.execute(
+                    "DELETE FROM rate_limits WHERE window_start < ?", (window_start - self.window,)
+                )
+            connection.execute("COMMIT")
+            return allowed
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+
+
+def create_rate_limiter(limit: int, window: int = 60, path: Optional[str] = None):
+    """Build the IP limiter, shared across workers when RATE_LIMIT_DB is set"""
+    path = path or os.environ.get('RATE_LIMIT_DB')
+    if path:
+        try:
+            limiter = SQLiteRateLimiter(path, limit, window)
+            logging.info(f"Rate limiter shared through {path}")
+            return limiter
+        except sqlite3.Error as e:
+            logging.error(f"Could not open rate limit store {path}, using in-memory limiter: {str(e)}")
+    return SlidingWindowLimiter(limit, window)
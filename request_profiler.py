@@ -0,0 +1,225 @@
+import io
+import os
+import hmac
+import json
+import time
+import random
+import pstats
+import logging
+import cProfile
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+from flask import Flask, g, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Request header carrying a signed profiling token (see make_profile_token)
+PROFILE_HEADER = 'X-Profile-Token'
+
+# Share of ordinary requests profiled automatically; 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Sampled profiles kept: only the slowest ones survive
+PROFILE_KEEP_SLOWEST = int(os.environ.get('PROFILE_KEEP_SLOWEST', 50))
+
+# Functions listed in a saved report, by cumulative time
+PROFILE_TOP_FUNCTIONS = 40
+
+# Bounds of what is stored per captured SQL statement
+MAX_SQL_STATEMENTS = 500
+MAX_SQL_LENGTH = 2000
+MAX_PARAMETERS_LENGTH = 300
+
+# Per-thread SQL capture of the request being profiled; None when not profiling
+_capture = threading.local()
+
+# One profiled request at a time per process (Python 3.12+ allows a single active profiler)
+_profile_lock = threading.Lock()
+
+
+def profile_token_secret() -> Optional[str]:
+    """Key signing X-Profile-Token values; None disables them.
+
+    Only an explicitly configured PROFILE_TOKEN_SECRET or SESSION_SECRET is
+    used: the development fallback secret key is public, so anyone could
+    forge tokens signed with it.
+    """
+    return os.environ.get('PROFILE_TOKEN_SECRET') or os.environ.get('SESSION_SECRET') or None
+
+
+def make_profile_token(secret_key: str, ttl: int = 3600) -> str:
+    """Signed token for the X-Profile-Token header, valid for ttl seconds"""
+    expires = int(time.time()) + ttl
+    signature = hmac.new(secret_key.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(secret_key: str, token: str) -> bool:
+    """Whether a profiling token was signed with secret_key and has not expired"""
+    try:
+        expires, signature = token.split('.', 1)
+        if int(expires) < time.time():
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(secret_key.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def _profile_trigger() -> Optional[str]:
+    """Why the current request should be profiled, or None"""
+    header = request.headers.get(PROFILE_HEADER)
+    if header:
+        secret_key = profile_token_secret()
+        if secret_key and verify_profile_token(secret_key, header):
+            return 'header'
+    if request.args.get('profile') == '1' and session.get('admin_logged_in'):
+        return 'admin'
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_capture, 'statements', None) is not None:
+        conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements = getattr(_capture, 'statements', None)
+    starts = conn.info.get('profiler_query_start')
+    if statements is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    _capture.count += 1
+    _capture.seconds += elapsed
+    if len(statements) < MAX_SQL_STATEMENTS:
+        statements.append({
+            "statement": statement[:MAX_SQL_LENGTH],
+            "parameters": repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            "executemany": executemany,
+            "duration_ms": round(elapsed * 1000, 3)
+        })
+
+
+class RequestProfiler:
+    """Runs selected requests under cProfile and records their SQL.
+
+    A request is profiled when it carries a valid signed X-Profile-Token
+    header, when an admin session adds ``?profile=1``, or, with
+    PROFILE_SAMPLE_RATE above zero, at random. Otherwise the only cost is
+    the trigger check in before_request. Only one request per process is
+    profiled at a time; others are served normally. Reports are saved as
+    RequestProfile rows through their own session, so saving them never
+    touches the request's transaction; sampled reports only keep the
+    PROFILE_KEEP_SLOWEST slowest ones.
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self._threshold = None  # Duration a sampled request must beat to be kept
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.before_request(lambda: self._start(app))
+        app.after_request(self._finish_response)
+        app.teardown_request(self._finish_failed)
+
+    def _start(self, app: Flask):
+        if request.endpoint == 'static':
+            return
+        trigger = _profile_trigger()
+        if trigger is None or not _profile_lock.acquire(blocking=False):
+            return
+        g.profiler = {
+            "trigger": trigger,
+            "admin_user": session.get('admin_username') if trigger == 'admin' else None,
+            "profile": cProfile.Profile(),
+            "started": time.perf_counter()
+        }
+        _capture.statements = []
+        _capture.count = 0
+        _capture.seconds = 0.0
+        g.profiler["profile"].enable()
+
+    def _finish_response(self, response):
+        state = g.pop('profiler', None)
+        if state is not None:
+            profile_id = self._finish(state, response.status_code)
+            if profile_id is not None:
+                response.headers['X-Profile-Id'] = str(profile_id)
+        return response
+
+    def _finish_failed(self, error):
+        # after_request is skipped when a view raises
+        state = g.pop('profiler', None)
+        if state is not None:
+            self._finish(state, 500)
+
+    def _finish(self, state: dict, status: int) -> Optional[int]:
+        """Stop profiling and save the report; returns its id when it was kept"""
+        state["profile"].disable()
+        duration = time.perf_counter() - state["started"]
+        statements = _capture.statements
+        sql_count, sql_seconds = _capture.count, _capture.seconds
+        _capture.statements = None
+        _profile_lock.release()
+
+        if state["trigger"] == 'sample' and self._threshold is not None and duration <= self._threshold:
+            return None
+
+        output = io.StringIO()
+        stats = pstats.Stats(state["profile"], stream=output)
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+
+        from models import db, RequestProfile
+        report = RequestProfile(
+            method=request.method,
+            path=request.path[:500],
+            query_string=request.query_string.decode('latin-1')[:500],
+            endpoint=request.endpoint,
+            status_code=status,
+            duration_ms=round(duration * 1000, 3),
+            sql_count=sql_count,
+            sql_time_ms=round(sql_seconds * 1000, 3),
+            sql_statements=json.dumps(statements),
+            stats_text=output.getvalue(),
+            trigger=state["trigger"],
+            admin_user=state["admin_user"],
+            created_at=datetime.utcnow()
+        )
+        try:
+            with Session(db.engine) as profile_session:
+                profile_session.add(report)
+                profile_session.commit()
+                if state["trigger"] == 'sample':
+                    self._prune_samples(profile_session)
+                return report.id
+        except Exception as e:
+            logging.error(f"Could not save request profile for {request.path}: {str(e)}")
+            return None
+
+    def _prune_samples(self, profile_session: Session):
+        """Keep only the slowest sampled profiles and remember the bar to beat"""
+        from models import RequestProfile
+        sampled = profile_session.query(RequestProfile.id, RequestProfile.duration_ms).filter(
+            RequestProfile.trigger == 'sample').order_by(RequestProfile.duration_ms.desc())
+        kept = sampled.limit(PROFILE_KEEP_SLOWEST).all()
+        if len(kept) < PROFILE_KEEP_SLOWEST:
+            self._threshold = None
+            return
+        self._threshold = kept[-1].duration_ms / 1000
+        profile_session.query(RequestProfile).filter(
+            RequestProfile.trigger == 'sample',
+            RequestProfile.id.notin_([row.id for row in kept])
+        ).delete(synchronize_session=False)
+        profile_session.commit()
+
+
+# Global profiler instance
+request_profiler = RequestProfiler()
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+# Returned by ResultCache.get when a key has no valid entry
+MISS = object()
+
+
+class ResultCache:
+    """Bounded LRU cache with a TTL whose entries are tagged with a data generation.
+
+    An entry only counts as a hit while its generation equals the caller's
+    current one, so bumping the generation after an import invalidates
+    every cached result at once without walking the cache. Stale entries
+    are dropped lazily when looked up or evicted.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, generation: Hashable) -> Any:
+        """Cached value for key in this generation, or MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if entry_generation == generation and time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISS
+
+    def put(self, key: Hashable, generation: Hashable, value: Any):
+        """Store a value for key in this generation, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Size and hit rate counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
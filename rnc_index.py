@@ -0,0 +1,117 @@
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from typing import FrozenSet, Iterable, Optional, Tuple
+import numpy as np
+from check_digit import checksum_valid_keys
+
+# Per-record flag bits
+FLAG_ACTIVE = 0x01
+
+
+def encode_rnc(rnc: str) -> int:
+    """Encode a 9 or 11 digit RNC as an integer key.
+
+    A leading '1' is prepended so that leading zeros survive the conversion
+    and a 9-digit RNC can never collide with an 11-digit cédula.
+    """
+    return int('1' + rnc)
+
+
+def decode_rnc(key: int) -> str:
+    """Inverse of encode_rnc"""
+    return str(key)[1:]
+
+
+def estado_flags(estado: Optional[str]) -> int:
+    """Compute the flag byte stored for a record's estado"""
+    flags = 0
+    if estado and estado.strip().upper() == 'ACTIVO':
+        flags |= FLAG_ACTIVE
+    return flags
+
+
+class RNCIndex:
+    """Compact in-memory existence index of every RNC in the dataset.
+
+    Keys live in a sorted ``array('Q')`` (8 bytes per record) with a parallel
+    ``bytearray`` of estado flags, so ~700k records fit in under 7 MB and a
+    lookup is a single binary search. RNCs published with a wrong check
+    digit are kept aside in ``checksum_exceptions`` so the check-digit
+    pre-filter never hides a record that exists.
+    """
+
+    def __init__(self, keys: array, flags: bytearray):
+        self.keys = keys
+        self.flags = flags
+        self.checksum_exceptions = self._checksum_exceptions(keys)
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, Optional[str]]]) -> 'RNCIndex':
+        """Build an index from (rnc, estado) pairs in any order"""
+        pairs = []
+        for rnc, estado in rows:
+            if not rnc or not rnc.isdigit():
+                continue
+            pairs.append((encode_rnc(rnc), estado_flags(estado)))
+        pairs.sort()
+
+        keys = array('Q')
+        flags = bytearray()
+        last_key = None
+        for key, flag in pairs:
+            if key == last_key:
+                continue
+            keys.append(key)
+            flags.append(flag)
+            last_key = key
+        return cls(keys, flags)
+
+    @classmethod
+    def from_database(cls) -> 'RNCIndex':
+        """Build an index from the rnc_records table"""
+        from models import db, RNCRecord
+
+        start_time = time.time()
+        rows = db.session.execute(
+            db.select(RNCRecord.rnc, RNCRecord.estado).execution_options(yield_per=20000)
+        )
+        index = cls.from_rows(rows)
+        logging.info(f"RNC index built with {len(index):,} records in {time.time() - start_time:.2f}s")
+        return index
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> 'RNCIndex':
+        """Build an index from a loaded RNCSnapshot"""
+        start_time = time.time()
+        index = cls.from_rows((rnc, fields.get('estado')) for rnc, fields in snapshot)
+        logging.info(f"RNC index built from snapshot with {len(index):,} records in {time.time() - start_time:.2f}s")
+        return index
+
+    @staticmethod
+    def _checksum_exceptions(keys: array) -> FrozenSet[str]:
+        """Indexed RNCs whose check digit does not verify"""
+        if not len(keys):
+            return frozenset()
+        keys = np.frombuffer(keys, dtype=np.uint64)
+        return frozenset(decode_rnc(int(key)) for key in keys[~checksum_valid_keys(keys)])
+
+    def lookup(self, rnc: str) -> Optional[int]:
+        """Return the flag byte for an RNC, or None if it is not indexed"""
+        key = encode_rnc(rnc)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.flags[position]
+        return None
+
+    def __contains__(self, rnc: str) -> bool:
+        return self.lookup(rnc) is not None
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the index in bytes"""
+        return self.keys.itemsize * len(self.keys) + len(self.flags)
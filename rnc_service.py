@@ -1,14 +1,136 @@
+import os
 import re
+import json
+import time
 import logging
-from typing import Dict, Optional, Tuple
-from models import RNCRecord
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import func
+from models import db, RNCRecord, DatasetInfo
+from rnc_index import RNCIndex, FLAG_ACTIVE
+from name_search import NameSearchIndex
+from rnc_snapshot import (RNCSnapshot, SnapshotError, get_snapshot_path, read_snapshot_version,
+                          write_snapshot_from_database)
+from result_cache import ResultCache, MISS
+from check_digit import check_identifier, checksum_valid_many
+
+# RNCs resolved per chunk by validate_many (one IN query each without the index)
+BULK_QUERY_CHUNK = 1000
+
+# Seconds before the cached dataset metadata is re-read, so every worker sees new imports
+DATASET_INFO_TTL = 60
+
+# Lookup result cache bounds
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 50000))
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 600))
+
+INVALID_FORMAT_MESSAGE = "Invalid RNC format. RNC must be 9 or 11 digits."
+INVALID_CHECKSUM_MESSAGE = "Invalid RNC check digit"
+
+STATS_COLUMNS = ["rnc", "nombre", "estado", "actividad_economica", "fecha_registro", "regimen"]
 
 class RNCService:
     def __init__(self):
         """Initialize RNC service with database backend"""
         self.data_loaded = True  # Always true since we use database
+        self.index: Optional[RNCIndex] = None
+        self.snapshot: Optional[RNCSnapshot] = None
+        self.name_index: Optional[NameSearchIndex] = None
+        self.dataset_info: Optional[Dict] = None
+        self.dataset_info_loaded_at = 0.0
+        self.ready = False  # Set once warm_up has loaded the lookup structures
+        self.generation = 0  # Incremented whenever lookup structures are reloaded
+        self.loaded_version: Optional[int] = None  # data_version the lookup structures were built from
+        self.fork_version: Optional[int] = None  # loaded_version inherited from a preloaded gunicorn master
+        self.stale_snapshot_version: Optional[int] = None  # Database version last reported ahead of the snapshot
+        self.result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
         logging.info("RNC Service initialized with PostgreSQL backend")
     
+    def load_snapshot(self, create: bool = False) -> bool:
+        """Memory-map the binary snapshot, optionally writing it from the database first"""
+        path = get_snapshot_path()
+        try:
+            if not os.path.exists(path):
+                if not create:
+                    return False
+                write_snapshot_from_database(path)
+            try:
+                snapshot = RNCSnapshot(path)
+            except SnapshotError:
+                # Left behind by an older release; rewrite it in the current format
+                if not create:
+                    raise
+                write_snapshot_from_database(path)
+                snapshot = RNCSnapshot(path)
+            self.snapshot = snapshot
+            logging.info(f"Snapshot loaded from {path}: {len(self.snapshot):,} records")
+            return True
+        except Exception as e:
+            logging.error(f"Error loading snapshot {path}: {str(e)}")
+            return False
+    
+    def load_index(self) -> bool:
+        """Build the in-memory RNC index and swap it in atomically"""
+        try:
+            if self.snapshot is not None:
+                self.index = RNCIndex.from_snapshot(self.snapshot)
+            else:
+                self.index = RNCIndex.from_database()
+            return True
+        except Exception as e:
+            logging.error(f"Error building RNC index: {str(e)}")
+            return False
+    
+    def load_name_index(self) -> bool:
+        """Build the name search index from the loaded snapshot"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.name_index = None
+            return False
+        try:
+            self.name_index = NameSearchIndex.from_snapshot(snapshot)
+            return True
+        except Exception as e:
+            logging.error(f"Error building name index: {str(e)}")
+            self.name_index = None
+            return False
+    
+    def reload(self, create_snapshot: bool = False) -> bool:
+        """Reload the snapshot and rebuild the indexes from it"""
+        self.load_snapshot(create=create_snapshot)
+        self.load_name_index()
+        loaded = self.load_index()
+        self.generation += 1
+        # Take the version from the file actually mapped: an import bumps data_version
+        # before it replaces the snapshot, so the cached metadata can be ahead of it
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.data_version is not None:
+            self.loaded_version = snapshot.data_version
+        else:
+            self.loaded_version = self.dataset_info["data_version"] if self.dataset_info else None
+        return loaded
+    
+    def warm_up(self) -> bool:
+        """Load the snapshot, indexes and dataset metadata, marking the service ready"""
+        try:
+            self.get_dataset_info()
+            self.reload()
+            self.ready = self.index is not None
+        except Exception as e:
+            logging.error(f"Warm-up failed: {str(e)}")
+            self.ready = False
+        if self.ready:
+            logging.info(f"RNC service ready: {len(self.index):,} records indexed")
+        return self.ready
+    
+    def _cache_generation(self) -> Optional[Tuple[int, int]]:
+        """Tag for cached results: local reloads plus the imported data version"""
+        try:
+            return self.generation, self.get_data_version()
+        except Exception as e:
+            logging.warning(f"Result cache disabled for this lookup: {str(e)}")
+            return None
+    
     def validate_rnc_format(self, rnc: str) -> bool:
         """Validate RNC format (can be 9 or 11 digits)"""
         if not rnc:
@@ -20,30 +142,71 @@ class RNCService:
         # Dominican RNCs can be 9 or 11 digits
         return clean_rnc.isdigit() and len(clean_rnc) in [9, 11]
     
+    def checksum_rejects(self, clean_rnc: str) -> bool:
+        """Whether a failed check digit alone proves a well-formed RNC is not in the dataset.
+
+        The DGII file does publish a few RNCs and cédulas with wrong check
+        digits; the index lists them, so without an index nothing is ruled out.
+        """
+        index = self.index
+        return index is not None and clean_rnc not in index.checksum_exceptions
+    
+    def precheck(self, clean_rnc: str) -> Tuple[Dict, Optional[Dict]]:
+        """Zero-I/O checks of a cleaned RNC.
+
+        Returns the format_valid/checksum_valid result and, when those checks
+        already settle the answer, the final (not found or error) result.
+        """
+        checks = check_identifier(clean_rnc)
+        if not checks["format_valid"]:
+            return checks, {"error": INVALID_FORMAT_MESSAGE, **checks, "exists": False}
+        if not checks["checksum_valid"] and self.checksum_rejects(clean_rnc):
+            return checks, {"rnc": clean_rnc, "exists": False, **checks, "message": INVALID_CHECKSUM_MESSAGE}
+        return checks, None
+    
     def search_rnc(self, rnc: str) -> Tuple[bool, Optional[Dict]]:
-        """Search for RNC in the database"""
-        clean_rnc = ""
+        """Search for RNC, serving repeated lookups (found or not) from the result cache"""
+        clean_rnc = re.sub(r'[^0-9]', '', rnc or '')
+        checks, rejected = self.precheck(clean_rnc)
+        if rejected is not None:
+            return False, rejected
+        
+        key = ('rnc', clean_rnc)
+        generation = self._cache_generation()
+        if generation is not None:
+            cached = self.result_cache.get(key, generation)
+            if cached is not MISS:
+                return cached
+        
+        result = self._search_rnc(clean_rnc, checks)
+        # Errors are not cached so they are retried on the next request
+        if generation is not None and result[1] and "error" not in result[1]:
+            self.result_cache.put(key, generation, result)
+        return result
+    
+    def _search_rnc(self, clean_rnc: str, checks: Dict) -> Tuple[bool, Optional[Dict]]:
+        """Search for a cleaned RNC that passed precheck in the snapshot or database"""
         try:
-            # Clean the input RNC
-            clean_rnc = re.sub(r'[^0-9]', '', rnc)
-            
-            # Validate format
-            if not self.validate_rnc_format(clean_rnc):
-                return False, {"error": "Invalid RNC format. RNC must be 9 or 11 digits."}
-            
-            # Search in database
-            record = RNCRecord.query.filter_by(rnc=clean_rnc).first()
+            # Serve from the memory-mapped snapshot when one is loaded
+            snapshot = self.snapshot
+            if snapshot is not None:
+                data = snapshot.lookup(clean_rnc)
+            else:
+                record = RNCRecord.query.filter_by(rnc=clean_rnc).first()
+                data = record.to_dict() if record else None
             
-            if record:
+            if data is not None:
                 return True, {
                     "rnc": clean_rnc,
                     "exists": True,
-                    "data": record.to_dict()
+                    **checks,
+                    "data": data
                 }
             else:
                 return False, {
                     "rnc": clean_rnc,
                     "exists": False,
+                    **checks,
                     "message": "RNC not found in database"
                 }
                 
@@ -51,7 +214,124 @@ class RNCService:
             logging.error(f"Error searching RNC {clean_rnc}: {str(e)}")
             return False, {"error": f"Database search error: {str(e)}"}
     
+    def get_info_payload(self, rnc: str) -> Tuple[Optional[bytes], Dict]:
+        """Pre-serialized JSON of an RNC's data from the snapshot and its precheck result.
+
+        The payload is None when there is no snapshot, the RNC is not in it or
+        precheck already rules it out.
+        """
+        clean_rnc = re.sub(r'[^0-9]', '', rnc or '')
+        checks, rejected = self.precheck(clean_rnc)
+        snapshot = self.snapshot
+        if snapshot is None or rejected is not None:
+            return None, checks
+        return snapshot.lookup_payload(clean_rnc), checks
+    
+    def validate_rnc(self, rnc: str) -> Tuple[bool, Dict]:
+        """Check whether an RNC exists, answering from the in-memory index when available"""
+        clean_rnc = re.sub(r'[^0-9]', '', rnc or '')
+        
+        checks, rejected = self.precheck(clean_rnc)
+        if rejected is not None:
+            return False, rejected
+        
+        index = self.index
+        if index is None:
+            exists, result = self.search_rnc(clean_rnc)
+            if result and "data" in result:
+                result = {key: value for key, value in result.items() if key != "data"}
+            return exists, result
+        
+        flags = index.lookup(clean_rnc)
+        if flags is None:
+            return False, {
+                "rnc": clean_rnc,
+                "exists": False,
+                **checks,
+                "message": "RNC not found in database"
+            }
+        return True, {
+            "rnc": clean_rnc,
+            "exists": True,
+            **checks,
+            "active": bool(flags & FLAG_ACTIVE)
+        }
+    
+    def validate_many(self, rncs: Iterable[str], include_data: bool = False) -> Iterator[Dict]:
+        """Validate many RNCs, yielding one result per input in the same order.
+
+        Format and check digits of a whole chunk are verified with numpy first;
+        only RNCs that pass go on to the in-memory index and snapshot when
+        loaded, or otherwise to a single IN query per chunk.
+        """
+        chunk = []
+        for rnc in rncs:
+            chunk.append(rnc)
+            if len(chunk) >= BULK_QUERY_CHUNK:
+                yield from self._validate_chunk(chunk, include_data)
+                chunk = []
+        if chunk:
+            yield from self._validate_chunk(chunk, include_data)
+
+    def _validate_chunk(self, rncs: List[str], include_data: bool) -> List[Dict]:
+        """Resolve one chunk of validate_many"""
+        cleaned = [re.sub(r'[^0-9]', '', str(rnc or '')) for rnc in rncs]
+        format_ok = [len(rnc) in (9, 11) for rnc in cleaned]
+        checksum_ok = checksum_valid_many(cleaned).tolist()
+        valid = [rnc for rnc, well_formed, checksum in zip(cleaned, format_ok, checksum_ok)
+                 if well_formed and (checksum or not self.checksum_rejects(rnc))]
+
+        index = self.index
+        snapshot = self.snapshot
+        found: Dict[str, Dict] = {}
+        if index is not None and (snapshot is not None or not include_data):
+            for rnc in valid:
+                flags = index.lookup(rnc)
+                if flags is None:
+                    continue
+                found[rnc] = {"active": bool(flags & FLAG_ACTIVE)}
+                if include_data:
+                    found[rnc]["data"] = snapshot.lookup(rnc)
+        elif valid:
+            for record in RNCRecord.query.filter(RNCRecord.rnc.in_(set(valid))):
+                data = record.to_dict()
+                found[record.rnc] = {"active": (data.get('estado') or '').upper() == 'ACTIVO'}
+                if include_data:
+                    found[record.rnc]["data"] = data
+
+        results = []
+        for original, rnc, well_formed, checksum in zip(rncs, cleaned, format_ok, checksum_ok):
+            checks = {"format_valid": well_formed, "checksum_valid": checksum}
+            if not well_formed:
+                results.append({
+                    "rnc": original,
+                    "exists": False,
+                    **checks,
+                    "error": INVALID_FORMAT_MESSAGE
+                })
+            elif rnc in found:
+                results.append({"rnc": rnc, "exists": True, **checks, **found[rnc]})
+            elif not checksum and self.checksum_rejects(rnc):
+                results.append({"rnc": rnc, "exists": False, **checks, "message": INVALID_CHECKSUM_MESSAGE})
+            else:
+                results.append({"rnc": rnc, "exists": False, **checks, "message": "RNC not found in database"})
+        return results
+
     def search_by_name(self, name_query: str, limit: int = 10) -> Tuple[bool, Dict]:
+        """Search for companies by name, serving repeated queries from the result cache"""
+        key = ('name', name_query, limit)
+        generation = self._cache_generation()
+        if generation is not None:
+            cached = self.result_cache.get(key, generation)
+            if cached is not MISS:
+                return cached
+        
+        success, result = self._search_by_name(name_query, limit)
+        if generation is not None and "error" not in result:
+            self.result_cache.put(key, generation, (success, result))
+        return success, result
+    
+    def _search_by_name(self, name_query: str, limit: int = 10) -> Tuple[bool, Dict]:
         """Search for companies by name with suggestions"""
         try:
             if not name_query or len(name_query.strip()) < 2:
@@ -60,26 +340,13 @@ class RNCService:
             # Clean and prepare search query
             clean_query = name_query.strip().upper()
             
-            # Search using ILIKE for case-insensitive partial matching
-            records = RNCRecord.query.filter(
-                RNCRecord.nombre.ilike(f'%{clean_query}%')
-            ).filter(
-                RNCRecord.nombre.isnot(None)
-            ).limit(limit).all()
+            name_index = self.name_index
+            if name_index is not None:
+                suggestions = name_index.search(clean_query, limit)
+            else:
+                suggestions = self._search_by_name_in_database(clean_query, limit)
             
-            if records:
-                suggestions = []
-                for record in records:
-                    suggestion = {
-                        "rnc": record.rnc,
-                        "nombre": record.nombre.strip() if record.nombre else "",
-                        "estado": record.estado.strip() if record.estado else "",
-                    }
-                    # Add additional info if available
-                    if record.actividad_economica and record.actividad_economica.strip():
-                        suggestion["actividad_economica"] = record.actividad_economica.strip()
-                    suggestions.append(suggestion)
-                
+            if suggestions:
                 return True, {
                     "query": name_query,
                     "suggestions": suggestions,
@@ -98,20 +365,102 @@ class RNCService:
             logging.error(f"Error searching by name '{name_query}': {str(e)}")
             return False, {"error": f"Database search error: {str(e)}"}
 
+    def _search_by_name_in_database(self, clean_query: str, limit: int) -> List[Dict]:
+        """Fallback name search using ILIKE while no name index is loaded"""
+        records = RNCRecord.query.filter(
+            RNCRecord.nombre.ilike(f'%{clean_query}%')
+        ).filter(
+            RNCRecord.nombre.isnot(None)
+        ).limit(limit).all()
+        
+        suggestions = []
+        for record in records:
+            suggestion = {
+                "rnc": record.rnc,
+                "nombre": record.nombre.strip() if record.nombre else "",
+                "estado": record.estado.strip() if record.estado else "",
+            }
+            # Add additional info if available
+            if record.actividad_economica and record.actividad_economica.strip():
+                suggestion["actividad_economica"] = record.actividad_economica.strip()
+            suggestions.append(suggestion)
+        return suggestions
+
+    def refresh_dataset_info(self, data_changed: bool = True) -> Dict:
+        """Recompute the dataset metadata row after an import and cache it"""
+        estado_counts: Dict[str, int] = {}
+        for estado, count in db.session.query(RNCRecord.estado, func.count()).group_by(RNCRecord.estado):
+            key = (estado or '').strip().upper() or 'SIN ESTADO'
+            estado_counts[key] = estado_counts.get(key, 0) + count
+        sample_rnc = db.session.query(RNCRecord.rnc).limit(1).scalar()
+        
+        info = db.session.get(DatasetInfo, 1)
+        if info is None:
+            info = DatasetInfo(id=1, data_version=0)
+            db.session.add(info)
+        info.total_records = sum(estado_counts.values())
+        info.active_records = estado_counts.get('ACTIVO', 0)
+        info.estado_counts = json.dumps(estado_counts, sort_keys=True)
+        info.sample_rnc = sample_rnc
+        if data_changed:
+            info.data_version = (info.data_version or 0) + 1
+        info.last_import_at = datetime.utcnow()
+        info.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        self.dataset_info = info.to_dict()
+        self.dataset_info_loaded_at = time.monotonic()
+        logging.info(f"Dataset info updated: version {info.data_version}, {info.total_records:,} records")
+        return self.dataset_info
+    
+    def get_dataset_info(self) -> Dict:
+        """Dataset metadata from memory, re-read from its single row at most every DATASET_INFO_TTL seconds"""
+        if self.dataset_info is not None and time.monotonic() - self.dataset_info_loaded_at < DATASET_INFO_TTL:
+            return self.dataset_info
+        
+        info = db.session.get(DatasetInfo, 1, populate_existing=True)
+        if info is None:
+            # First start after upgrading: compute the metadata once
+            return self.refresh_dataset_info(data_changed=True)
+        self.dataset_info = info.to_dict()
+        self.dataset_info_loaded_at = time.monotonic()
+        return self.dataset_info
+    
+    def get_data_version(self) -> int:
+        """Version of the loaded dataset, incremented by every import that changed data"""
+        return self.get_dataset_info()["data_version"]
+    
+    def available_version(self) -> Optional[int]:
+        """data_version a reload would load: the snapshot file's, or the database's without one.
+
+        A reload maps the snapshot file, so a database version ahead of it
+        (an import still writing the file, or a file written before the
+        dataset row existed) is only logged; reloading would map the same
+        file again.
+        """
+        version = self.get_data_version()
+        file_version = read_snapshot_version()
+        if file_version is None:
+            return version
+        if version > file_version and self.stale_snapshot_version != version:
+            self.stale_snapshot_version = version
+            logging.warning(f"Snapshot has data version {file_version} but the database has {version}; "
+                            f"keeping the loaded data until the snapshot is rewritten")
+        return file_version
+    
     def get_database_stats(self) -> Dict:
         """Get statistics about the database"""
         try:
-            total_records = RNCRecord.query.count()
-            
-            # Get a sample RNC for demonstration
-            sample_record = RNCRecord.query.first()
-            sample_rnc = sample_record.rnc if sample_record else None
-            
+            info = self.get_dataset_info()
             return {
                 "loaded": True,
-                "total_records": total_records,
-                "columns": ["rnc", "nombre", "estado", "actividad_economica", "fecha_registro", "regimen"],
-                "sample_rnc": sample_rnc
+                "total_records": info["total_records"],
+                "active_records": info["active_records"],
+                "estado_counts": info["estado_counts"],
+                "columns": STATS_COLUMNS,
+                "sample_rnc": info["sample_rnc"],
+                "data_version": info["data_version"],
+                "last_import": info["last_import"]
             }
         except Exception as e:
             logging.error(f"Error getting database stats: {str(e)}")
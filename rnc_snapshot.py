@@ -0,0 +1,282 @@
+import os
+import json
+import mmap
+import struct
+import sys
+import logging
+import shutil
+import tempfile
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from models import RECORD_FIELDS, clean_record_fields
+
+# Binary snapshot layout (all integers little-endian):
+#
+#   header   magic, format version, field count, record count, created_at,
+#            the byte offsets of the three sections below, and the
+#            dataset data_version the records were dumped at
+#   fields   field names joined by '|' (UTF-8)
+#   keys     record_count fixed-width RNC keys, space padded, sorted
+#   offsets  record_count uint64 heap offsets, in key order
+#   heap     per record, the pre-serialized JSON payload (uint32 length,
+#            UTF-8 bytes) followed by one (uint16 length, UTF-8 bytes)
+#            entry per field
+SNAPSHOT_MAGIC = b'RNCSNAP\x00'
+SNAPSHOT_VERSION = 3
+KEY_WIDTH = 11
+HEADER = struct.Struct('<8sHHIQQQQQ')
+# Format 2 lacked the trailing data_version; such files are still readable
+HEADER_V2 = struct.Struct('<8sHHIQQQQ')
+FIELD_LENGTH = struct.Struct('<H')
+PAYLOAD_LENGTH = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+
+DEFAULT_SNAPSHOT_PATH = os.path.join('attached_assets', 'rnc_snapshot.bin')
+
+
+def get_snapshot_path() -> str:
+    """Location of the binary snapshot file"""
+    return os.environ.get('RNC_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+
+
+def read_snapshot_version(path: Optional[str] = None) -> Optional[int]:
+    """data_version in a snapshot file's header, or None when there is no readable format 3 file"""
+    try:
+        with open(path or get_snapshot_path(), 'rb') as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, version = struct.unpack_from('<8sH', header, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    return HEADER.unpack(header)[-1]
+
+
+def encode_key(rnc: str) -> bytes:
+    """Encode an RNC as a fixed-width snapshot key"""
+    return rnc.encode('ascii').ljust(KEY_WIDTH, b' ')
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or of another version"""
+
+
+def _encode_field(value: str) -> bytes:
+    """UTF-8 encode a field value, truncated to what a uint16 length can hold"""
+    data = value.encode('utf-8')
+    if len(data) > 0xFFFF:
+        data = data[:0xFFFF].decode('utf-8', 'ignore').encode('utf-8')
+    return data
+
+
+def encode_payload(fields: Dict) -> bytes:
+    """Serialize a record's API fields the way Flask's jsonify does (sorted keys, compact, ASCII)"""
+    return json.dumps(fields, sort_keys=True, separators=(',', ':'), ensure_ascii=True).encode('ascii')
+
+
+def write_snapshot(records: Iterable[Tuple[str, Dict]], path: str, data_version: int = 0) -> int:
+    """Write (rnc, fields) pairs to a snapshot file tagged with a data_version.
+
+    Records may arrive in any order; keys are sorted before the key table
+    is written and later duplicates of an RNC are ignored. The file is
+    assembled next to its destination and moved into place with
+    ``os.replace`` so readers never observe a partially written snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    keys = []
+    starts = array('Q')
+
+    with tempfile.TemporaryFile(dir=directory) as heap:
+        heap_size = 0
+        for rnc, values in records:
+            keys.append(encode_key(rnc))
+            starts.append(heap_size)
+
+            cleaned = clean_record_fields(values)
+            payload = encode_payload(cleaned)
+            heap.write(PAYLOAD_LENGTH.pack(len(payload)))
+            heap.write(payload)
+            heap_size += PAYLOAD_LENGTH.size + len(payload)
+            for field in RECORD_FIELDS:
+                data = _encode_field(cleaned.get(field, ''))
+                heap.write(FIELD_LENGTH.pack(len(data)))
+                heap.write(data)
+                heap_size += FIELD_LENGTH.size + len(data)
+
+        sorted_keys = bytearray()
+        offsets = array('Q')
+        last_key = None
+        for position in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[position]
+            if key == last_key:
+                continue
+            sorted_keys += key
+            offsets.append(starts[position])
+            last_key = key
+        del keys, starts
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+
+        count = len(offsets)
+        field_names = '|'.join(RECORD_FIELDS).encode('utf-8')
+        keys_offset = HEADER.size + len(field_names)
+        offsets_offset = keys_offset + len(sorted_keys)
+        heap_offset = offsets_offset + offsets.itemsize * count
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(RECORD_FIELDS), count,
+                                      int(time.time()), keys_offset, offsets_offset, heap_offset,
+                                      data_version))
+                out.write(field_names)
+                out.write(sorted_keys)
+                out.write(offsets.tobytes())
+                heap.seek(0)
+                shutil.copyfileobj(heap, out, 1024 * 1024)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return count
+
+
+def write_snapshot_from_database(path: Optional[str] = None) -> int:
+    """Dump the rnc_records table into a snapshot file tagged with the current data_version.
+
+    Imports bump data_version before writing the snapshot, so a file never
+    claims a newer version than the records it holds; at worst a reader
+    maps it early and reloads once more when it sees the new version.
+    """
+    from models import db, RNCRecord, DatasetInfo
+
+    path = path or get_snapshot_path()
+    start_time = time.time()
+    data_version = db.session.query(DatasetInfo.data_version).filter(DatasetInfo.id == 1).scalar() or 0
+    columns = [RNCRecord.rnc] + [getattr(RNCRecord, field) for field in RECORD_FIELDS]
+    rows = db.session.execute(
+        db.select(*columns).execution_options(yield_per=20000)
+    )
+    count = write_snapshot(((row[0], dict(zip(RECORD_FIELDS, row[1:]))) for row in rows), path, data_version)
+    logging.info(f"Snapshot v{data_version} written to {path}: {count:,} records in {time.time() - start_time:.2f}s")
+    return count
+
+
+class RNCSnapshot:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    Every process mapping the same file shares its pages through the OS page
+    cache, so lookups need neither a database connection nor a private copy
+    of the data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"Snapshot file is empty: {path}")
+
+        if len(self._mm) < HEADER_V2.size:
+            raise SnapshotError(f"Snapshot file is truncated: {path}")
+        magic, version = struct.unpack_from('<8sH', self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"Not an RNC snapshot file: {path}")
+        if version == SNAPSHOT_VERSION:
+            header = HEADER
+            (_, _, field_count, self.count, self.created_at, self._keys_offset, self._offsets_offset,
+             self._heap_offset, self.data_version) = HEADER.unpack_from(self._mm, 0)
+        elif version == 2:
+            header = HEADER_V2
+            (_, _, field_count, self.count, self.created_at, self._keys_offset, self._offsets_offset,
+             self._heap_offset) = HEADER_V2.unpack_from(self._mm, 0)
+            self.data_version = None  # Unknown; the next import rewrites the file
+        else:
+            raise SnapshotError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+
+        self.fields = tuple(self._mm[header.size:self._keys_offset].decode('utf-8').split('|'))
+        if len(self.fields) != field_count:
+            raise SnapshotError(f"Snapshot field table is corrupt: {path}")
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """Release the memory map"""
+        self._mm.close()
+
+    def key_at(self, position: int) -> str:
+        """RNC stored at a sorted position"""
+        start = self._keys_offset + position * KEY_WIDTH
+        return self._mm[start:start + KEY_WIDTH].rstrip(b' ').decode('ascii')
+
+    def find(self, rnc: str) -> Optional[int]:
+        """Binary search for an RNC, returning its position"""
+        key = encode_key(rnc)
+        mm = self._mm
+        base = self._keys_offset
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            start = base + mid * KEY_WIDTH
+            if mm[start:start + KEY_WIDTH] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count:
+            start = base + low * KEY_WIDTH
+            if mm[start:start + KEY_WIDTH] == key:
+                return low
+        return None
+
+    def _record_start(self, position: int) -> int:
+        """Absolute file offset of a record's heap entry"""
+        (offset,) = OFFSET.unpack_from(self._mm, self._offsets_offset + position * OFFSET.size)
+        return self._heap_offset + offset
+
+    def payload_at(self, position: int) -> bytes:
+        """Pre-serialized JSON of the API fields of the record at a sorted position"""
+        cursor = self._record_start(position)
+        (length,) = PAYLOAD_LENGTH.unpack_from(self._mm, cursor)
+        cursor += PAYLOAD_LENGTH.size
+        return self._mm[cursor:cursor + length]
+
+    def record_at(self, position: int) -> Dict:
+        """Decode the non-empty fields of the record at a sorted position"""
+        mm = self._mm
+        cursor = self._record_start(position)
+        (payload_length,) = PAYLOAD_LENGTH.unpack_from(mm, cursor)
+        cursor += PAYLOAD_LENGTH.size + payload_length
+        result = {}
+        for field in self.fields:
+            (length,) = FIELD_LENGTH.unpack_from(mm, cursor)
+            cursor += FIELD_LENGTH.size
+            if length:
+                result[field] = mm[cursor:cursor + length].decode('utf-8')
+                cursor += length
+        return result
+
+    def lookup(self, rnc: str) -> Optional[Dict]:
+        """Return the API fields for an RNC, or None if it is not in the snapshot"""
+        position = self.find(rnc)
+        if position is None:
+            return None
+        return self.record_at(position)
+
+    def lookup_payload(self, rnc: str) -> Optional[bytes]:
+        """Return the pre-serialized JSON payload for an RNC, or None if it is not in the snapshot"""
+        position = self.find(rnc)
+        if position is None:
+            return None
+        return self.payload_at(position)
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict]]:
+        for position in range(self.count):
+            yield self.key_at(position), self.record_at(position)
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import text
+from models import db, APIToken
+
+# Upper bound on remembered unknown token values
+MAX_MISSING_TOKENS = 10000
+
+
+class CachedToken:
+    """In-memory copy of an APIToken with a write-behind usage counter"""
+
+    __slots__ = ('id', 'name', 'requests_per_hour', 'expires_at', 'requests_used',
+                 'last_reset', 'pending', 'reset_pending', 'loaded_at')
+
+    def __init__(self, token: APIToken):
+        self.pending = 0  # Requests not yet written to api_tokens
+        self.reset_pending = False  # Hourly reset not yet written to api_tokens
+        self.refresh(token)
+
+    def refresh(self, token: APIToken):
+        """Copy the current database state of the token, keeping unflushed usage"""
+        self.id = token.id
+        self.name = token.name
+        self.requests_per_hour = token.requests_per_hour or 0
+        self.expires_at = token.expires_at
+        self.requests_used = (token.requests_used or 0) + self.pending
+        self.last_reset = token.last_reset
+        self.loaded_at = time.monotonic()
+
+    def is_expired(self):
+        """Check if token is expired"""
+        if self.expires_at:
+            return datetime.utcnow() > self.expires_at
+        return False
+
+
+class TokenCache:
+    """Token lookups and quota accounting without a database write per request.
+
+    Tokens are cached for ``ttl`` seconds (invalid tokens included), quota
+    checks and increments happen in memory under a lock, and the accumulated
+    usage is written back to api_tokens in one batch at most every
+    ``flush_interval`` seconds. Each flush also re-reads the counters, so
+    with several workers a token's quota reflects the others' usage within
+    about ``flush_interval`` seconds; it can only be exceeded by what the
+    other workers served in that time. Usage is always written as an
+    increment, also across the hourly reset, so workers never overwrite
+    each other's counts. Admin changes to a token must call
+    ``invalidate`` so they take effect immediately in this process.
+    """
+
+    def __init__(self, ttl: float = 60, flush_interval: float = 5):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._tokens: Dict[str, CachedToken] = {}
+        self._missing: Dict[str, float] = {}  # Unknown or inactive token values
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.hits = 0  # Lookups answered from memory
+        self.misses = 0  # Lookups that went to the database
+
+    def get(self, token_value: str) -> Optional[CachedToken]:
+        """Return the active token for a value, loading it from the database when stale"""
+        now = time.monotonic()
+        entry = self._tokens.get(token_value)
+        if entry is not None and now - entry.loaded_at < self.ttl:
+            self.hits += 1
+            return entry
+        missing_at = self._missing.get(token_value)
+        if missing_at is not None and now - missing_at < self.ttl:
+            self.hits += 1
+            return None
+        self.misses += 1
+
+        # Write back our own usage first so the reloaded counter includes it
+        self.flush()
+        token = APIToken.query.filter_by(token=token_value, is_active=True).first()
+        with self._lock:
+            if token is None:
+                self._tokens.pop(token_value, None)
+                if len(self._missing) >= MAX_MISSING_TOKENS:
+                    self._missing.clear()
+                self._missing[token_value] = now
+                return None
+            self._missing.pop(token_value, None)
+            entry = self._tokens.get(token_value)
+            if entry is None:
+                entry = self._tokens[token_value] = CachedToken(token)
+            else:
+                entry.refresh(token)
+        return entry
+
+    def consume(self, entry: CachedToken, cost: int = 1) -> bool:
+        """Atomically reserve ``cost`` requests from a token's hourly quota"""
+        with self._lock:
+            current_time = datetime.utcnow()
+            if entry.last_reset is None or current_time - entry.last_reset >= timedelta(hours=1):
+                logging.info(f"Token {entry.name}: Resetting request count from {entry.requests_used} to 0. "
+                             f"Last reset: {entry.last_reset}, Current time: {current_time}")
+                entry.requests_used = 0
+                entry.pending = 0
+                entry.last_reset = current_time
+                entry.reset_pending = True
+
+            if entry.requests_used + cost > entry.requests_per_hour:
+                return False
+            entry.requests_used += cost
+            entry.pending += cost
+            return True
+
+    def maybe_flush(self):
+        """Flush pending usage and pick up other processes' usage if the flush interval has elapsed"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+            self.sync()
+
+    def flush(self):
+        """Write accumulated usage to api_tokens in a single transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            updates = []
+            for entry in self._tokens.values():
+                if not (entry.pending or entry.reset_pending):
+                    continue
+                updates.append((entry, entry.pending, entry.reset_pending, entry.last_reset))
+                entry.pending = 0
+                entry.reset_pending = False
+
+        if not updates:
+            return
+
+        try:
+            for entry, pending, reset_pending, last_reset in updates:
+                if reset_pending:
+                    # Another process may already have started the new hour; then our usage
+                    # is added to its count instead of replacing it
+                    db.session.execute(
+                        text("UPDATE api_tokens SET "
+                             "requests_used = CASE WHEN last_reset IS NULL OR last_reset <= :expired "
+                             "THEN :used ELSE COALESCE(requests_used, 0) + :used END, "
+                             "last_reset = CASE WHEN last_reset IS NULL OR last_reset <= :expired "
+                             "THEN :last_reset ELSE last_reset END "
+                             "WHERE id = :id"),
+                        {"used": pending, "last_reset": last_reset, "expired": last_reset - timedelta(hours=1),
+                         "id": entry.id}
+                    )
+                else:
+                    db.session.execute(
+                        text("UPDATE api_tokens SET requests_used = COALESCE(requests_used, 0) + :used WHERE id = :id"),
+                        {"used": pending, "id": entry.id}
+                    )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error flushing token usage: {str(e)}")
+            # Keep the counts so the next flush retries them
+            with self._lock:
+                for entry, pending, reset_pending, _ in updates:
+                    entry.pending += pending
+                    entry.reset_pending = entry.reset_pending or reset_pending
+
+    def sync(self):
+        """Reload the usage counters of cached tokens written by other processes"""
+        with self._lock:
+            ids = [entry.id for entry in self._tokens.values()]
+        if not ids:
+            return
+
+        try:
+            rows = db.session.execute(
+                db.select(APIToken.id, APIToken.requests_used, APIToken.last_reset).where(APIToken.id.in_(ids))
+            ).all()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error reading token usage: {str(e)}")
+            return
+
+        counters = {row.id: row for row in rows}
+        with self._lock:
+            for entry in self._tokens.values():
+                row = counters.get(entry.id)
+                # An unflushed reset is newer than the stored window; once flushed, the stored one wins
+                if row is None or entry.reset_pending:
+                    continue
+                # Usage consumed here since the flush is still pending on top of the stored count
+                entry.last_reset = row.last_reset
+                entry.requests_used = (row.requests_used or 0) + entry.pending
+
+    def invalidate(self, token_value: Optional[str] = None):
+        """Drop one token (or all tokens) from the cache after flushing its usage"""
+        self.flush()
+        with self._lock:
+            if token_value is None:
+                self._tokens.clear()
+                self._missing.clear()
+            else:
+                self._tokens.pop(token_value, None)
+                self._missing.pop(token_value, None)
+
+
+# Global token cache instance
+token_cache = TokenCache()
@@ -0,0 +1,254 @@
+import os
+import csv
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+from typing import Iterator, List, Optional, Tuple
+from models import db, APIToken, ValidationJob
+from name_search import normalize_name, names_match
+
+VALIDATION_JOBS_FOLDER = os.path.join('attached_assets', 'validation_jobs')
+
+# Header names recognized for the RNC and company name columns
+RNC_HEADERS = ('RNC', 'RNC CEDULA', 'CEDULA', 'RNC O CEDULA', 'IDENTIFICACION', 'DOCUMENTO')
+NAME_HEADERS = ('NOMBRE', 'NAME', 'RAZON SOCIAL', 'NOMBRE O RAZON SOCIAL', 'EMPRESA', 'PROVEEDOR', 'CLIENTE')
+
+# Columns appended to every row of the result file
+RESULT_COLUMNS = ['existe', 'estado', 'regimen', 'nombre_dgii', 'coincide_nombre']
+
+
+def allowed_validation_file(filename: str) -> bool:
+    """Check if a file can be submitted as a validation job"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'csv', 'txt', 'xlsx'}
+
+
+class ValidationJobRunner:
+    """Validates uploaded CSV/Excel files of counterparties in the background.
+
+    Rows are streamed from the input file in chunks, resolved in bulk with
+    ``RNCService.validate_many`` and appended to a result CSV as they go, so
+    memory use does not depend on the size of the file. Progress is written
+    to the job row after every chunk. Each chunk is charged to the quota of
+    the token that submitted the job before it is validated; a job whose
+    token runs out of quota stops with an error.
+    """
+
+    def __init__(self, max_workers: int = 1, chunk_size: int = 5000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='validation-job')
+        self.chunk_size = chunk_size
+
+    def submit(self, app, file_storage, api_token_id: Optional[int] = None) -> ValidationJob:
+        """Save an uploaded file and queue its validation"""
+        from werkzeug.utils import secure_filename
+
+        os.makedirs(VALIDATION_JOBS_FOLDER, exist_ok=True)
+        job = ValidationJob()
+        job.filename = secure_filename(file_storage.filename) or 'archivo.csv'
+        job.api_token_id = api_token_id
+        job.status = 'queued'
+        db.session.add(job)
+        db.session.commit()
+
+        input_path = os.path.join(VALIDATION_JOBS_FOLDER, f"{job.id}_{job.filename}")
+        file_storage.save(input_path)
+
+        self.executor.submit(self._run, app, job.id, input_path)
+        logging.info(f"📥 Validation job {job.id} queued for {job.filename}")
+        return job
+
+    def _run(self, app, job_id: int, input_path: str):
+        """Execute one validation job inside its own application context"""
+        with app.app_context():
+            try:
+                job = db.session.get(ValidationJob, job_id)
+                job.status = 'processing'
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+
+                result_path = os.path.join(VALIDATION_JOBS_FOLDER, f"{job_id}_resultado.csv")
+                self._validate_file(job, input_path, result_path)
+
+                job.result_path = result_path
+                job.status = 'success'
+                job.progress = 100.0
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                logging.info(f"✅ Validation job {job_id} finished: {job.rows_processed:,} rows")
+
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"❌ Validation job {job_id} failed: {str(e)}")
+                job = db.session.get(ValidationJob, job_id)
+                if job:
+                    job.status = 'error'
+                    job.error_message = str(e)
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+            finally:
+                if os.path.exists(input_path):
+                    os.remove(input_path)
+                db.session.remove()
+
+    def _validate_file(self, job: ValidationJob, input_path: str, result_path: str):
+        """Stream the input rows through the validator into the result file"""
+        from rnc_service import rnc_service
+
+        if input_path.lower().endswith('.xlsx'):
+            rows, progress = self._read_excel(input_path)
+        else:
+            rows, progress = self._read_csv(input_path)
+
+        header, has_header, rows = self._split_header(rows)
+        rnc_column, name_column = self._find_columns(header if has_header else None)
+        token = db.session.get(APIToken, job.api_token_id) if job.api_token_id else None
+
+        with open(result_path, 'w', encoding='utf-8-sig', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(header + RESULT_COLUMNS)
+
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                if token is not None:
+                    self._charge(job, token, len(chunk))
+                rncs = [row[rnc_column] if rnc_column < len(row) else '' for row in chunk]
+                results = rnc_service.validate_many(rncs, include_data=True)
+                for row, result in zip(chunk, results):
+                    writer.writerow(row + self._annotate(row, result, name_column, job))
+                job.rows_processed = (job.rows_processed or 0) + len(chunk)
+                job.progress = progress()
+                db.session.commit()
+
+    @staticmethod
+    def _charge(job: ValidationJob, token: APIToken, rows: int):
+        """Reserve one request per row from the quota of the job's token"""
+        from api_handlers import authorize_token
+
+        _, error = authorize_token(token.token, cost=rows)
+        if error:
+            _, status = error
+            reason = 'se agotó la cuota por hora del token' if status == 429 else 'el token ya no es válido'
+            raise RuntimeError(f"Validación detenida tras {job.rows_processed or 0:,} filas: {reason}")
+
+    @staticmethod
+    def _annotate(row: List[str], result: dict, name_column: Optional[int], job: ValidationJob) -> List[str]:
+        """Result columns for one input row"""
+        if 'error' in result:
+            job.rows_invalid = (job.rows_invalid or 0) + 1
+            return ['FORMATO INVALIDO', '', '', '', '']
+        if not result['exists'] and not result.get('checksum_valid', True):
+            job.rows_invalid = (job.rows_invalid or 0) + 1
+            return ['DIGITO VERIFICADOR INVALIDO', '', '', '', '']
+        if not result['exists']:
+            job.rows_not_found = (job.rows_not_found or 0) + 1
+            return ['NO', '', '', '', '']
+
+        job.rows_found = (job.rows_found or 0) + 1
+        data = result.get('data') or {}
+        official_name = data.get('nombre', '')
+        given_name = row[name_column] if name_column is not None and name_column < len(row) else ''
+        if any(ch.isalpha() for ch in given_name):
+            match = 'SI' if names_match(given_name, official_name) else 'NO'
+        else:
+            match = ''
+        return ['SI', data.get('estado', ''), data.get('regimen', ''), official_name, match]
+
+    @staticmethod
+    def _split_header(rows: Iterator[List[str]]) -> Tuple[List[str], bool, Iterator[List[str]]]:
+        """Take the first row as header unless it already looks like data.
+
+        Returns (header, has_header, rows); files without a header get
+        generic column names in the result.
+        """
+        first = next(rows, None)
+        if first is None:
+            raise ValueError('El archivo está vacío')
+        if any(normalize_name(cell) in RNC_HEADERS + NAME_HEADERS for cell in first):
+            return first, True, rows
+        return [f'columna_{i + 1}' for i in range(len(first))], False, chain([first], rows)
+
+    @staticmethod
+    def _find_columns(header: Optional[List[str]]) -> Tuple[int, Optional[int]]:
+        """Positions of the RNC column and (if present) the company name column"""
+        if header is None:
+            return 0, 1
+        normalized = [normalize_name(cell) for cell in header]
+        rnc_column = next((i for i, name in enumerate(normalized) if name in RNC_HEADERS), 0)
+        name_column = next((i for i, name in enumerate(normalized) if name in NAME_HEADERS), None)
+        return rnc_column, name_column
+
+    @staticmethod
+    def _read_csv(path: str):
+        """Row iterator and progress function for a CSV or text file"""
+        with open(path, 'rb') as f:
+            sample = f.read(64 * 1024)
+        encoding = 'utf-8-sig'
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut at the end of the sample is still UTF-8
+            if e.start < len(sample) - 3:
+                encoding = 'cp1252'
+
+        text = sample.decode(encoding, errors='ignore')
+        try:
+            dialect = csv.Sniffer().sniff(text.split('\n', 20)[0], delimiters=',;|\t')
+        except csv.Error:
+            dialect = csv.excel
+
+        file_size = os.path.getsize(path) or 1
+        handle = open(path, 'r', encoding=encoding, errors='replace', newline='')
+
+        def rows():
+            with handle:
+                for row in csv.reader(handle, dialect):
+                    if any(cell.strip() for cell in row):
+                        yield [cell.strip() for cell in row]
+
+        def progress():
+            return min(handle.buffer.tell() / file_size * 100, 100.0) if not handle.closed else 100.0
+
+        return rows(), progress
+
+    @staticmethod
+    def _read_excel(path: str):
+        """Row iterator and progress function for the first sheet of an .xlsx file"""
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError('La validación de archivos Excel requiere el paquete openpyxl')
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        sheet = workbook.active
+        total_rows = sheet.max_row or 1
+        read_rows = [0]
+
+        def rows():
+            try:
+                for values in sheet.iter_rows(values_only=True):
+                    read_rows[0] += 1
+                    row = [ValidationJobRunner._cell_text(value) for value in values]
+                    if any(row):
+                        yield row
+            finally:
+                workbook.close()
+
+        def progress():
+            return min(read_rows[0] / total_rows * 100, 100.0)
+
+        return rows(), progress
+
+    @staticmethod
+    def _cell_text(value) -> str:
+        """Text of an Excel cell; whole numbers lose the '.0' Excel stores them with"""
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+
+
+# Global job runner instance
+validation_job_runner = ValidationJobRunner()